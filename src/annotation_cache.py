@@ -0,0 +1,45 @@
+# annotation_cache.py (基于内容哈希的章节标注缓存)
+import os
+import time
+
+from sqlite_lru import SqliteLruCache, content_key
+
+
+class AnnotationCache(SqliteLruCache):
+    """
+    持久化的 LLM 标注缓存
+    键为 hash(章节文本, 提示词模板, 模型名)，值为模型返回的标注文本。
+    使用 SQLite 存储，可被多个进程共享；超过条目数或总字节数上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, cache_dir, max_entries=5000, max_bytes=512 * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        super().__init__(os.path.join(cache_dir, 'annotations.sqlite3'), 'annotations', 'idx_last_access',
+                         max_entries, max_bytes, value_columns=" annotated_text TEXT NOT NULL,")
+
+    @staticmethod
+    def make_key(text, prompt_template, model_name):
+        """根据章节文本、提示词模板和模型名计算缓存键"""
+        return content_key(model_name, prompt_template, text)
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT annotated_text FROM annotations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return row[0]
+
+    def put(self, key, annotated_text):
+        """写入缓存并执行淘汰"""
+        size = len(annotated_text.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO annotations (key, annotated_text, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, annotated_text, size, time.time()))
+            self._evict()
+            self._conn.commit()
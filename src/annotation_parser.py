@@ -0,0 +1,74 @@
+# annotation_parser.py (LLM 标注文本的单遍解析)
+import re
+import sys
+from itertools import chain
+from typing import NamedTuple
+
+NARRATION_ROLE = "叙述"
+
+# 标注标记只在同一行内有效
+_MARKER_PATTERN = re.compile(r'\[(?P<role>[^|\]\n]+)\|(?P<emotion>[^\]\n]+)\]')
+
+
+class AnnotationSegment(NamedTuple):
+    """
+    标注片段
+    基于元组存储，比 dict 更省内存；保留 get() 和按字段名下标访问，兼容原先按 dict 使用的代码。
+    """
+    type: str
+    speaker: str
+    text: str
+    emotion: str
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def to_dict(self):
+        return self._asdict()
+
+
+_new_segment = tuple.__new__
+
+
+def _marker_fields(role, emotion):
+    emotion = sys.intern(emotion.lower())
+    if role == NARRATION_ROLE:
+        return "narration", "Narrator", emotion
+    return "dialogue", sys.intern(role), emotion
+
+
+def iter_annotated_segments(annotated_text):
+    """
+    单遍扫描标注文本，逐个产出 AnnotationSegment
+    每个 [角色|情感] 标记开启一个新片段，直到下一个标记或行尾；一行中有多个标记时拆成多个片段。
+    没有标记的行作为中性叙述（空行跳过）。
+    """
+    markers = {}
+    current = None  # 当前标记的 (type, speaker, emotion)，None 表示不在标记片段中
+    start = 0
+    # 末尾追加 None 以便用同一段逻辑处理最后一个标记之后的文本
+    for match in chain(_MARKER_PATTERN.finditer(annotated_text), (None,)):
+        end = match.start() if match is not None else len(annotated_text)
+        head, newline, rest = annotated_text[start:end].partition('\n')
+        head = head.strip()
+        if current is not None:
+            yield _new_segment(AnnotationSegment, (current[0], current[1], head, current[2]))
+        elif head:
+            yield _new_segment(AnnotationSegment, ("narration", "Narrator", head, "neutral"))
+        if newline:
+            for line in rest.split('\n'):
+                line = line.strip()
+                if line:
+                    yield _new_segment(AnnotationSegment, ("narration", "Narrator", line, "neutral"))
+        if match is None:
+            break
+        key = match.group('role', 'emotion')
+        current = markers.get(key)
+        if current is None:
+            current = markers[key] = _marker_fields(*key)
+        start = match.end()
@@ -0,0 +1,232 @@
+# annotation_store.py (章节标注的紧凑二进制存储，mmap 随机访问)
+import os
+import json
+import mmap
+import struct
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+
+from annotation_parser import AnnotationSegment
+
+# 文件布局（小端序）:
+#   头部      magic, 版本, 片段数, speaker 数, emotion 数, 各区段偏移
+#   字符串表  speaker / emotion 依次存放，每项为 u16 长度 + UTF-8 字节
+#   列        type(u8) / speaker 序号(u16) / emotion 序号(u8) / 文本偏移(u32, 片段数 + 1 项)，各列按 4 字节对齐
+#   文本区    所有片段文本的 UTF-8 字节首尾相接，第 i 段为 [offset[i], offset[i + 1])
+STORE_SUFFIX = '.anno'
+STORE_MAGIC = b'ANNO'
+STORE_VERSION = 1
+_HEADER = struct.Struct('<4sHHIII6I')
+_LENGTH = struct.Struct('<H')
+_OFFSET = struct.Struct('<I')
+
+SEGMENT_TYPES = ('narration', 'dialogue')
+_TYPE_IDS = {name: i for i, name in enumerate(SEGMENT_TYPES)}
+
+
+def _align(position, alignment=4):
+    return (position + alignment - 1) // alignment * alignment
+
+
+def _encode_table(strings):
+    return b''.join(_LENGTH.pack(len(data)) + data for data in (s.encode('utf-8') for s in strings))
+
+
+def write_annotation_store(path, segments):
+    """
+    将标注片段（AnnotationSegment 或 dict）写成二进制文件，先写临时文件再重命名
+    speaker 超过 65535 种、emotion 超过 255 种或文本超过 4 GB 时抛出 ValueError，不写入任何文件。
+    """
+    segments = list(segments)
+    speakers, emotions = {}, {}
+    text_size = 0
+    for segment in segments:
+        speakers.setdefault(segment.get('speaker', 'Narrator'), len(speakers))
+        emotions.setdefault(segment.get('emotion', 'neutral'), len(emotions))
+        text_size += len(segment.get('text', '').encode('utf-8'))
+    # 先检查各表大小再打包，否则超出上限时 struct.pack / bytearray.append 会先抛出难以理解的错误
+    if len(speakers) > 0xFFFF or len(emotions) > 0xFF or text_size > 0xFFFFFFFF:
+        raise ValueError(f"标注内容超出二进制格式上限（{len(speakers)} 个 speaker，{len(emotions)} 种 emotion，"
+                         f"文本 {text_size} 字节）: {path}")
+
+    types, speaker_ids, emotion_ids, offsets = bytearray(), bytearray(), bytearray(), bytearray()
+    texts = []
+    text_size = 0
+    offsets += _OFFSET.pack(0)
+    for segment in segments:
+        text = segment.get('text', '').encode('utf-8')
+        types.append(_TYPE_IDS.get(segment.get('type', 'narration'), 0))
+        speaker_ids += struct.pack('<H', speakers[segment.get('speaker', 'Narrator')])
+        emotion_ids.append(emotions[segment.get('emotion', 'neutral')])
+        texts.append(text)
+        text_size += len(text)
+        offsets += _OFFSET.pack(text_size)
+
+    count = len(types)
+    sections = []
+    position = _HEADER.size
+    for data in (_encode_table(speakers), _encode_table(emotions), types, speaker_ids, emotion_ids, offsets):
+        position = _align(position)
+        sections.append((position, data))
+        position += len(data)
+    text_start = _align(position)
+
+    header = _HEADER.pack(STORE_MAGIC, STORE_VERSION, 0, count, len(speakers), len(emotions),
+                          *(offset for offset, _ in sections[2:]), text_start, text_size)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for offset, data in sections:
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+        f.write(b'\0' * (text_start - f.tell()))
+        for text in texts:
+            f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _read_table(buffer, position, count):
+    strings = []
+    for _ in range(count):
+        (length,) = _LENGTH.unpack_from(buffer, position)
+        position += _LENGTH.size
+        strings.append(bytes(buffer[position:position + length]).decode('utf-8'))
+        position += length
+    return tuple(strings)
+
+
+class AnnotationStore(Sequence):
+    """
+    只读的章节标注，按片段序号随机访问
+    打开时只解析头部和 speaker / emotion 表，片段在访问时才从 mmap 中解码，
+    因此打开整本书的标注只需毫秒级时间；可以像列表一样遍历、取长度和下标。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self._count, speaker_count, emotion_count, self._types, self._speaker_ids,
+         self._emotion_ids, self._offsets, self._text_start, _) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            self._mmap.close()
+            raise ValueError(f"不是有效的标注文件: {path}")
+        tables = _align(_HEADER.size)
+        self.speakers = _read_table(self._mmap, tables, speaker_count)
+        emotion_table = _align(tables + sum(_LENGTH.size + len(s.encode('utf-8')) for s in self.speakers))
+        self.emotions = _read_table(self._mmap, emotion_table, emotion_count)
+
+    def __len__(self):
+        return self._count
+
+    def _segment(self, index):
+        data = self._mmap
+        start, end = struct.unpack_from('<II', data, self._offsets + 4 * index)
+        (speaker_id,) = struct.unpack_from('<H', data, self._speaker_ids + 2 * index)
+        text = data[self._text_start + start:self._text_start + end].decode('utf-8')
+        return AnnotationSegment(SEGMENT_TYPES[data[self._types + index]], self.speakers[speaker_id], text,
+                                 self.emotions[data[self._emotion_ids + index]])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._segment(i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._segment(index)
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self._segment(index)
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def to_dicts(self):
+        return [segment.to_dict() for segment in self]
+
+    def export_json(self, path):
+        """导出为与 annotations/*.json 相同格式的 JSON（用于调试）"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dicts(), f, ensure_ascii=False, indent=2)
+
+
+# BookAnnotations 同时保持打开的章节数：CPython 的 mmap 会复制文件描述符，
+# 整本书的章节全部打开时一千多章就会超出默认的 1024 个描述符上限
+MAX_OPEN_STORES = 64
+
+
+def _chapter_sort_key(chapter_num):
+    # chapter_99 排在 chapter_100 之前
+    digits = ''.join(ch for ch in chapter_num if ch.isdigit())
+    return int(digits) if digits else 0, chapter_num
+
+
+class BookAnnotations(Mapping):
+    """
+    整本书的章节标注 {章节编号: 片段序列}，按章节编号排序
+    创建时只列出文件，访问某一章时才打开；二进制 .anno 以 mmap 打开，
+    最多同时保持 max_open 个，超过时关闭最久未访问的章节（之前取得的该章节对象随之失效），
+    没有 .anno 的章节回退读取 .json。
+    """
+
+    def __init__(self, annotations_dir, max_open=MAX_OPEN_STORES):
+        self.annotations_dir = annotations_dir
+        self.max_open = max(1, max_open)
+        paths = {}
+        for name in os.listdir(annotations_dir):
+            chapter_num, ext = os.path.splitext(name)
+            if not name.startswith('chapter_') or ext not in (STORE_SUFFIX, '.json'):
+                continue
+            if ext == STORE_SUFFIX or chapter_num not in paths:
+                paths[chapter_num] = os.path.join(annotations_dir, name)
+        self._paths = OrderedDict(sorted(paths.items(), key=lambda item: _chapter_sort_key(item[0])))
+        self._open = OrderedDict()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __contains__(self, chapter_num):
+        return chapter_num in self._paths
+
+    def __getitem__(self, chapter_num):
+        path = self._paths[chapter_num]
+        if not path.endswith(STORE_SUFFIX):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        store = self._open.get(chapter_num)
+        if store is not None:
+            self._open.move_to_end(chapter_num)
+            return store
+        store = self._open[chapter_num] = AnnotationStore(path)
+        while len(self._open) > self.max_open:
+            self._open.popitem(last=False)[1].close()
+        return store
+
+    def close(self):
+        while self._open:
+            self._open.popitem()[1].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_annotations(annotations_dir, max_open=MAX_OPEN_STORES):
+    """
+    加载目录中所有章节的标注，返回按章节编号排序的 BookAnnotations
+    优先使用二进制 .anno 文件（访问时才以 mmap 打开，按需解码），没有时回退到 .json；用完后调用 close()。
+    """
+    return BookAnnotations(annotations_dir, max_open)
@@ -0,0 +1,98 @@
+# audio_cache.py (基于内容寻址的片段音频缓存)
+import os
+import re
+import time
+import threading
+import unicodedata
+
+from sqlite_lru import SqliteLruCache, content_key
+
+
+def normalize_segment_text(text):
+    """缓存键使用的文本规范化：Unicode NFC，合并连续空白并去掉首尾空白"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class SegmentAudioCache(SqliteLruCache):
+    """
+    持久化的片段音频缓存
+    键为 hash(规范化文本, 实际使用的 speaker, 语言, 模型版本)，与片段在章节中的位置无关，
+    重新标注导致片段序号变化、重复出现的台词或叙述都能直接复用已合成的音频。
+    WAV 数据按键名存为独立文件（先写临时文件再重命名），SQLite 只保存索引；
+    超过条目数或总字节数上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, cache_dir, max_entries=200000, max_bytes=2048 * 1024 * 1024):
+        self.audio_dir = os.path.join(cache_dir, 'audio')
+        os.makedirs(self.audio_dir, exist_ok=True)
+        super().__init__(os.path.join(cache_dir, 'segments.sqlite3'), 'segments', 'idx_segments_last_access',
+                         max_entries, max_bytes)
+
+    @staticmethod
+    def make_key(text, speaker, language, model_version):
+        """根据规范化文本、speaker、语言和模型版本计算缓存键"""
+        return content_key(model_version, language, speaker, normalize_segment_text(text))
+
+    def _audio_path(self, key):
+        # 按键的前两位分子目录，避免单个目录下文件过多
+        return os.path.join(self.audio_dir, key[:2], f'{key}.wav')
+
+    def __contains__(self, key):
+        """是否已缓存（不计入命中统计，不更新访问时间）"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM segments WHERE key = ?", (key,)).fetchone()
+        return row is not None and os.path.exists(self._audio_path(key))
+
+    def get(self, key):
+        """读取缓存的 WAV 字节，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM segments WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                try:
+                    with open(self._audio_path(key), 'rb') as f:
+                        audio_bytes = f.read()
+                except OSError:
+                    audio_bytes = None
+                if audio_bytes:
+                    self.hits += 1
+                    self._touch(key)
+                    return audio_bytes
+                # 索引存在但音频文件丢失或为空
+                self._conn.execute("DELETE FROM segments WHERE key = ?", (key,))
+                self._conn.commit()
+            self.misses += 1
+            return None
+
+    def discard(self, key):
+        """移除缓存条目（例如校验未通过的音频），不存在时忽略"""
+        with self._lock:
+            self._conn.execute("DELETE FROM segments WHERE key = ?", (key,))
+            self._conn.commit()
+        self._on_evicted([key])
+
+    def put(self, key, audio_bytes):
+        """写入缓存并执行淘汰"""
+        path = self._audio_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(audio_bytes)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO segments (key, size, last_access) VALUES (?, ?, ?)",
+                (key, len(audio_bytes), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _on_evicted(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._audio_path(key))
+            except OSError:
+                pass
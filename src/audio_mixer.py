@@ -0,0 +1,259 @@
+# audio_mixer.py (线性时间的章节混音)
+import os
+import wave
+import subprocess
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pydub = lazy_import('pydub')
+
+# 片段之间插入的静音时长（毫秒）与背景音效增益（dB）
+SEGMENT_SILENCE_MS = 200
+BACKGROUND_GAIN_DB = -15
+# pydub AudioSegment.silent 的默认参数，混音输出格式不会低于它
+SILENT_FRAME_RATE = 11025
+SILENT_SAMPLE_WIDTH = 2
+
+SAMPLE_DTYPES = {1: 'int8', 2: 'int16', 4: 'int32'}
+
+
+def find_background_effect(effect_dir):
+    """查找背景音效文件，不存在时返回 None"""
+    effect_file = os.path.join(effect_dir, 'background.wav')
+    if not os.path.exists(effect_file):
+        for fallback in ['forest.wav', 'ambient.wav', 'music.wav']:
+            fallback_file = os.path.join(effect_dir, fallback)
+            if os.path.exists(fallback_file):
+                effect_file = fallback_file
+                break
+    return effect_file if os.path.exists(effect_file) else None
+
+
+def _load_wav(wav_file):
+    try:
+        return pydub.AudioSegment.from_wav(wav_file)
+    except Exception as e:
+        print(f"  -> 加载音频失败 {wav_file}: {str(e)}")
+        return None
+
+
+def _convert(audio, frame_rate, channels, sample_width):
+    if audio.frame_rate != frame_rate:
+        audio = audio.set_frame_rate(frame_rate)
+    if audio.channels != channels:
+        audio = audio.set_channels(channels)
+    if audio.sample_width != sample_width:
+        audio = audio.set_sample_width(sample_width)
+    return audio
+
+
+def _samples(audio):
+    return np.frombuffer(audio.raw_data, dtype=SAMPLE_DTYPES[audio.sample_width])
+
+
+def _read_header(wav_file):
+    """
+    只读取 WAV 头，返回 (frame_rate, channels, sample_width, 帧数, None)
+    wave 无法识别的格式退回 pydub 完整解码，返回值最后一项为解码结果，供混音时直接使用；都失败返回 None。
+    """
+    try:
+        with wave.open(wav_file, 'rb') as f:
+            return f.getframerate(), f.getnchannels(), f.getsampwidth(), f.getnframes(), None
+    except (wave.Error, EOFError, OSError):
+        audio = _load_wav(wav_file)
+        if audio is None:
+            return None
+        return audio.frame_rate, audio.channels, audio.sample_width, len(audio.raw_data) // audio.frame_width, audio
+
+
+def resolve_output_format(wav_files, bg_audio=None):
+    """
+    计算混音输出格式 (frame_rate, channels, sample_width, [(片段文件, 采样率, 帧数, 已解码的音频或 None), ...])
+    与 pydub 逐段 += / overlay 的同步规则一致：各项取所有参与音频的最大值。
+    格式和帧数取自 WAV 头，片段只在写入混音缓冲区时解码一次。
+    """
+    frame_rate, channels, sample_width = SILENT_FRAME_RATE, 1, SILENT_SAMPLE_WIDTH
+    valid = []
+    for wav_file in wav_files:
+        header = _read_header(wav_file)
+        if header is None:
+            continue
+        source_rate, source_channels, source_width, frame_count, audio = header
+        frame_rate = max(frame_rate, source_rate)
+        channels = max(channels, source_channels)
+        sample_width = max(sample_width, source_width)
+        valid.append((wav_file, source_rate, frame_count, audio))
+    if bg_audio is not None:
+        frame_rate = max(frame_rate, bg_audio.frame_rate)
+        channels = max(channels, bg_audio.channels)
+        sample_width = max(sample_width, bg_audio.sample_width)
+    if sample_width == 3:
+        sample_width = 4
+    return frame_rate, channels, sample_width, valid
+
+
+def load_background(effect_file, gain_db=BACKGROUND_GAIN_DB):
+    """加载背景音效并应用增益"""
+    if not effect_file:
+        return None
+    try:
+        return pydub.AudioSegment.from_wav(effect_file) + gain_db
+    except Exception as e:
+        print(f"加载背景音效失败 {effect_file}: {str(e)}")
+        return None
+
+
+def ratecv_frame_count(frame_count, from_rate, to_rate):
+    """audioop.ratecv（pydub set_frame_rate）转换后的帧数"""
+    if from_rate == to_rate or frame_count == 0:
+        return frame_count
+    return (frame_count - 1) * to_rate // from_rate + 1
+
+
+def chapter_frame_count(valid, silence_ms=SEGMENT_SILENCE_MS, bg_audio=None):
+    """
+    原先逐段 chapter += audio + silent(silence_ms) 再 overlay 背景得到的帧数
+    pydub 每次拼接都会把采样率较低的一方整体重采样，章节中途出现更高的采样率时，
+    之前拼好的部分作为一整段重新换算帧数，因此不等于各片段分别重采样后的帧数之和。
+    """
+    silence_frames = int(SILENT_FRAME_RATE * silence_ms / 1000.0)
+    rate, frames = SILENT_FRAME_RATE, 0
+    for _, source_rate, frame_count, _ in valid:
+        piece_rate = max(source_rate, SILENT_FRAME_RATE)
+        piece = (ratecv_frame_count(frame_count, source_rate, piece_rate)
+                 + ratecv_frame_count(silence_frames, SILENT_FRAME_RATE, piece_rate))
+        new_rate = max(rate, piece_rate)
+        frames = ratecv_frame_count(frames, rate, new_rate) + ratecv_frame_count(piece, piece_rate, new_rate)
+        rate = new_rate
+    if bg_audio is not None:
+        new_rate = max(rate, bg_audio.frame_rate)
+        frames = overlay_frame_count(ratecv_frame_count(frames, rate, new_rate), new_rate)
+    return frames
+
+
+def overlay_frame_count(frame_count, frame_rate):
+    """pydub overlay 后的帧数：先四舍五入到整毫秒，再换算回帧"""
+    milliseconds = round(1000 * frame_count / frame_rate)
+    return int(milliseconds * frame_rate / 1000)
+
+
+def overlay_background(samples, bg_samples, start_sample=0):
+    """
+    在 samples 上循环叠加背景音效（原地修改），溢出部分按采样位宽饱和截断
+    start_sample 为 samples 在整章中的起始位置，用于分块叠加时对齐背景循环。
+    """
+    if bg_samples is None or len(bg_samples) == 0 or len(samples) == 0:
+        return samples
+    offset = start_sample % len(bg_samples)
+    repeats = (offset + len(samples)) // len(bg_samples) + 1
+    tiled = np.tile(bg_samples, repeats)[offset:offset + len(samples)]
+    info = np.iinfo(samples.dtype)
+    mixed = samples.astype(np.int64) + tiled
+    np.clip(mixed, info.min, info.max, out=mixed)
+    samples[:] = mixed
+    return samples
+
+
+def mix_chapter_segments(wav_files, effect_file=None, silence_ms=SEGMENT_SILENCE_MS):
+    """
+    将章节片段拼接为一个 AudioSegment，每段后追加 silence_ms 静音，并循环叠加背景音效
+    先计算总长度并一次性分配 NumPy 缓冲区，各片段解码后直接写入对应位置，
+    避免 AudioSegment += 每次复制整段缓冲区造成的二次方开销。
+    输出帧数与原先逐段 += 的结果一致（见 chapter_frame_count），需要重采样时采样值会略有不同。
+    没有有效音频时返回 None。
+    """
+    bg_audio = load_background(effect_file)
+    frame_rate, channels, sample_width, valid = resolve_output_format(wav_files, bg_audio)
+    if not valid:
+        return None
+
+    # 静音按 pydub 的方式生成后再转换格式，保证帧数与逐段 += 的结果一致
+    silence = _convert(pydub.AudioSegment.silent(duration=silence_ms), frame_rate, channels, sample_width)
+    silence_frames = len(silence.raw_data) // silence.frame_width
+    total_frames = chapter_frame_count(valid, silence_ms, bg_audio)
+    # 各片段分别重采样的帧数与 total_frames 可能差几帧：每段多留 1 帧余量，结尾按 total_frames 裁掉或补静音
+    buffer_frames = max(total_frames, sum(int(round(frame_count * frame_rate / source_rate)) + 1 + silence_frames
+                                          for _, source_rate, frame_count, _ in valid))
+
+    buffer = np.zeros(buffer_frames * channels, dtype=SAMPLE_DTYPES[sample_width])
+    position = 0
+    for wav_file, _, _, audio in valid:
+        audio = audio if audio is not None else _load_wav(wav_file)
+        if audio is None:
+            continue
+        samples = _samples(_convert(audio, frame_rate, channels, sample_width))
+        end = min(position + len(samples), len(buffer))
+        buffer[position:end] = samples[:end - position]
+        position = end + silence_frames * channels
+        print(f"  -> 已添加: {os.path.basename(wav_file)}")
+    buffer = buffer[:total_frames * channels]
+
+    if bg_audio is not None:
+        bg_samples = _samples(_convert(bg_audio, frame_rate, channels, sample_width))
+        overlay_background(buffer, bg_samples)
+
+    return pydub.AudioSegment(data=buffer.tobytes(), sample_width=sample_width, frame_rate=frame_rate,
+                               channels=channels)
+
+
+def stream_chapter_to_mp3(wav_files, output_file, effect_file=None, bitrate='192k', silence_ms=SEGMENT_SILENCE_MS,
+                          window_seconds=10):
+    """
+    边混音边编码：将片段、静音和背景音效按窗口混合后直接写入 ffmpeg 的标准输入
+    峰值内存只与单个片段和窗口大小有关，与章节总时长无关。
+    先写入临时文件，编码成功后再重命名为 output_file。
+    没有有效音频时返回 False。
+    """
+    bg_audio = load_background(effect_file)
+    frame_rate, channels, sample_width, valid = resolve_output_format(wav_files, bg_audio)
+    if not valid:
+        return False
+
+    silence = _convert(pydub.AudioSegment.silent(duration=silence_ms), frame_rate, channels, sample_width)
+    silence_samples = _samples(silence)
+    bg_samples = None
+    if bg_audio is not None:
+        bg_samples = _samples(_convert(bg_audio, frame_rate, channels, sample_width))
+    total_samples = chapter_frame_count(valid, silence_ms, bg_audio) * channels
+    window = max(1, int(window_seconds * frame_rate)) * channels
+
+    temp_file = output_file + '.part'
+    command = [pydub.AudioSegment.converter, '-y', '-loglevel', 'error',
+               '-f', f's{sample_width * 8}le', '-ar', str(frame_rate), '-ac', str(channels), '-i', 'pipe:0',
+               '-b:a', bitrate, '-f', 'mp3', temp_file]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    written = 0
+
+    def _write(samples):
+        nonlocal written
+        samples = samples[:max(0, total_samples - written)]
+        for start in range(0, len(samples), window):
+            chunk = samples[start:start + window].copy()
+            overlay_background(chunk, bg_samples, written)
+            process.stdin.write(chunk.tobytes())
+            written += len(chunk)
+
+    try:
+        for wav_file, _, _, audio in valid:
+            audio = audio if audio is not None else _load_wav(wav_file)
+            if audio is None:
+                continue
+            _write(_samples(_convert(audio, frame_rate, channels, sample_width)))
+            _write(silence_samples)
+            print(f"  -> 已添加: {os.path.basename(wav_file)}")
+        # 与整章混音保持相同长度：不足部分补静音（叠加背景）
+        while written < total_samples:
+            _write(np.zeros(min(window, total_samples - written), dtype=silence_samples.dtype))
+        process.stdin.close()
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg 编码失败: {stderr.decode('utf-8', errors='replace').strip()}")
+        os.replace(temp_file, output_file)
+        return True
+    except Exception:
+        if process.poll() is None:
+            process.kill()
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
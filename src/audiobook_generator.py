@@ -4,22 +4,45 @@ import logging
 from pathlib import Path
 
 import yaml
-import torch
-import whisper
 import json
 import re
-import jiwer
-import jieba
-from ollama import Client
-from TTS.api import TTS
-from pydub import AudioSegment
+from lazy_imports import lazy_import
+from annotation_cache import AnnotationCache
+from audio_cache import SegmentAudioCache
+from segment_dedup import DEDUP_REPORT_FILE, build_dedup_options, precompute_repeated_segments
+from annotation_parser import iter_annotated_segments
+from annotation_store import STORE_SUFFIX, write_annotation_store
+from tts_engine import XttsSynthesisEngine
+from speaker_latent_store import SpeakerLatentStore
+from model_registry import get_tts_models, get_tts_worker_pool, get_whisper_model, model_session
+from tts_worker_pool import TTS_REPLICA_MEMORY_MB, TTS_THREADS_PER_PROCESS, TtsWorkerPool, plan_tts_workers
+from audio_mixer import find_background_effect, mix_chapter_segments, stream_chapter_to_mp3
+from chapter_splitter import split_chapters, load_unchanged_toc, save_split_state
 import sys
 import glob
+import bisect
+import math
+import queue
+import random
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 重量级依赖延迟到首次使用时才导入，只做下载或 RSS 的流程不受影响
+torch = lazy_import('torch')
+whisper = lazy_import('whisper')
+jiwer = lazy_import('jiwer')
+jieba = lazy_import('jieba')
+np = lazy_import('numpy')
+ollama = lazy_import('ollama')
 
 # 设置环境变量
 os.environ["COQUI_TOS_AGREED"] = "1"
-# 全局客户端初始化
-ollama_client = Client()
+# Ollama 客户端在首次标注时创建
+_ollama_client = None
+_ollama_client_lock = threading.Lock()
+# Whisper 模型在多个线程间共享（未使用独立校验线程时由各 TTS 线程直接校验），转录时串行化
+_whisper_lock = threading.Lock()
 
 
 # --- 日志配置函数 ---
@@ -64,52 +87,26 @@ def chinese_tokenizer(text):
 
 
 def extract_chapters(input_file, output_dir):
-    chapters_dir = os.path.join(output_dir, 'chapters')
-    os.makedirs(chapters_dir, exist_ok=True)
-
-    content = None
-    encodings_to_try = ['utf-8', 'gbk', 'gb18030', 'latin1', 'cp1252']
-    for enc in encodings_to_try:
-        try:
-            with open(input_file, 'r', encoding=enc) as f:
-                content = f.read()
-            print(f"成功使用编码 '{enc}' 读取文件: {input_file}")
-            break
-        except UnicodeDecodeError:
-            continue
-        except Exception as e:
-            print(f"使用编码 '{enc}' 读取文件时发生其他错误: {e}")
-            continue
-
-    if content is None:
-        print(f"警告：无法使用标准编码读取文件 {input_file}。将使用 'utf-8' 编码并替换错误字符。")
-        with open(input_file, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
+    """
+    按章节标题分割输入文件，写出 chapters/chapter_XX.txt 和 toc.json，返回章节文件列表
+    分割是流式的：边读边写章节文件，内存占用与输入文件大小无关。
+    输入文件未变化时直接沿用上次的结果；重新分割时也只改写内容有变化的章节文件。
+    """
+    toc = load_unchanged_toc(input_file, output_dir)
+    if toc is not None:
+        print(f"输入文件未变化，沿用已有的 {len(toc)} 个章节: {input_file}")
+        return [entry["file"] for entry in toc]
 
-    chapter_pattern = r'(?P<title>(?:Chapter\s+\d+|CHAPTER\s+[IVXLC]+|第[\s\S]{1,9}?章|序章|引子|尾声|后记))'
-    matches = list(re.finditer(chapter_pattern, content, flags=re.IGNORECASE))
-    chapter_files = []
-    toc = []
-    if not matches:
-        print(f"警告: 在 {input_file} 中未检测到章节标题，将整个文件作为一章处理")
-        chapter_file = os.path.join(chapters_dir, 'chapter_01.txt')
-        with open(chapter_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-        toc.append({"chapter": 1, "title": "全文", "file": chapter_file})
-        chapter_files.append(chapter_file)
+    chapters_dir = os.path.join(output_dir, 'chapters')
+    toc, encoding = split_chapters(input_file, chapters_dir)
+    if encoding is not None:
+        print(f"成功使用编码 '{encoding}' 读取文件: {input_file}")
     else:
-        for i in range(len(matches)):
-            start = matches[i].start()
-            end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
-            chapter_title = matches[i].group('title').strip()
-            chapter_text = content[start:end].strip()
-            chapter_file = os.path.join(chapters_dir, f'chapter_{i + 1:02d}.txt')
-            with open(chapter_file, 'w', encoding='utf-8') as f:
-                f.write(chapter_text)
-            toc.append({"chapter": i + 1, "title": chapter_title, "file": chapter_file})
-            chapter_files.append(chapter_file)
-    with open(os.path.join(output_dir, 'toc.json'), 'w', encoding='utf-8') as f:
-        json.dump(toc, f, ensure_ascii=False, indent=2)
+        print(f"警告：无法使用标准编码读取文件 {input_file}。已使用 'utf-8' 编码并替换错误字符。")
+    if len(toc) == 1 and toc[0]["title"] == "全文":
+        print(f"警告: 在 {input_file} 中未检测到章节标题，将整个文件作为一章处理")
+    chapter_files = [entry["file"] for entry in toc]
+    save_split_state(input_file, output_dir, toc)
     print(f"章节分割完成，共 {len(chapter_files)} 个章节")
     return chapter_files
 
@@ -123,9 +120,19 @@ def clean_ollama_response(response_text):
     return cleaned_text
 
 
-def analyze_chapter(text):
-    try:
-        prompt = f"""You are a novel analysis assistant. Please carefully read the following novel text and annotate it based on the original text:
+def get_ollama_client():
+    """获取全局 Ollama 客户端（首次调用时创建）"""
+    global _ollama_client
+    with _ollama_client_lock:
+        if _ollama_client is None:
+            _ollama_client = ollama.Client()
+        return _ollama_client
+
+
+# 章节标注使用的模型与提示词（二者均参与标注缓存的键计算）
+ANNOTATION_MODEL = "mistral:7b"
+ANNOTATION_SYSTEM_PROMPT = "You are a novel text annotation expert. Please strictly add markers to the original text according to the format, and do not use <THINK> tags."
+ANNOTATION_PROMPT_TEMPLATE = """You are a novel analysis assistant. Please carefully read the following novel text and annotate it based on the original text:
 Requirements:
 1.  Preserve all content and formatting of the original text.
 2.  Add a marker before dialogue: [Character Name|Emotion], for example: [Zhang San|joy]"Hello!"
@@ -140,78 +147,169 @@ The text is as follows:
 {text}
 Please return the fully annotated text.
 """
+# 长章节分块标注时使用：前文仅供判断说话人，不标注、不返回
+ANNOTATION_CHUNK_PROMPT_TEMPLATE = """You are a novel analysis assistant. Please carefully read the following novel text and annotate it based on the original text:
+Requirements:
+1.  Preserve all content and formatting of the original text.
+2.  Add a marker before dialogue: [Character Name|Emotion], for example: [Zhang San|joy]"Hello!"
+3.  Add a marker before narrative paragraphs: [Narration|Emotion], for example: [Narration|neutral]Night fell.
+4.  Emotion categories are limited to: joy, anger, fear, sadness, surprise, neutral.
+5.  Do not change the original text content, only add markers.
+6.  Every paragraph or sentence must be annotated.
+7.  Maintain the original line breaks and paragraph structure.
+8.  Return only the annotated text, do not add any explanations or notes.
+9.  Do not use <THINK> tags or any other thought process indicators.
+10. The preceding context is given only to help identify speakers. Do not annotate it and do not include it in your answer.
+Preceding context (do not annotate):
+{context}
+The text to annotate is as follows:
+{text}
+Please return the fully annotated text.
+"""
+
+# 分块标注默认参数：每块最多字符数、作为上下文附带的前一块末尾段落数、同一章节并发标注的块数
+ANNOTATION_CHUNK_CHARS = 3000
+ANNOTATION_CHUNK_OVERLAP = 2
+ANNOTATION_CHUNK_WORKERS = 2
+
+
+def build_annotation_options(config):
+    """从配置中读取分块标注和标注导出参数"""
+    return {
+        "chunk_chars": int(config.get('annotation_chunk_chars', ANNOTATION_CHUNK_CHARS)),
+        "overlap": int(config.get('annotation_chunk_overlap', ANNOTATION_CHUNK_OVERLAP)),
+        "workers": max(1, int(config.get('annotation_chunk_workers', ANNOTATION_CHUNK_WORKERS))),
+        "json_export": bool(config.get('annotation_json_export', True)),
+    }
+
+
+def split_into_windows(text, chunk_chars=ANNOTATION_CHUNK_CHARS, overlap=ANNOTATION_CHUNK_OVERLAP):
+    """
+    按段落（行）把章节切成不超过 chunk_chars 的块，返回 [(上下文, 块文本), ...]
+    上下文是前一块末尾 overlap 个非空段落，只用于帮助模型判断说话人；
+    各块文本按顺序用换行拼接即为原文。单个超长段落单独成块，不在段落中间切开。
+    """
+    windows = []
+    current = []
+    size = 0
+    for line in text.split('\n'):
+        if current and size + len(line) + 1 > chunk_chars:
+            windows.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    windows.append(current)
+
+    result = []
+    previous = []
+    for lines in windows:
+        context = [line for line in previous if line.strip()][-overlap:] if overlap > 0 else []
+        result.append(('\n'.join(context), '\n'.join(lines)))
+        previous = lines
+    return result
+
+
+def annotate_window(text, context='', cache=None):
+    """
+    调用 LLM 标注一段文本，返回 (标注结果, 是否成功)
+    没有上下文时使用整章提示词，与不分块时的缓存条目通用。
+    """
+    if context:
+        prompt = ANNOTATION_CHUNK_PROMPT_TEMPLATE.format(context=context, text=text)
+    else:
+        prompt = ANNOTATION_PROMPT_TEMPLATE.format(text=text)
+    cache_key = None
+    if cache is not None:
+        if context:
+            cache_key = cache.make_key(prompt, ANNOTATION_SYSTEM_PROMPT, ANNOTATION_MODEL)
+        else:
+            cache_key = cache.make_key(text, ANNOTATION_SYSTEM_PROMPT + ANNOTATION_PROMPT_TEMPLATE, ANNOTATION_MODEL)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            return cached_text, True
+    try:
         messages = [
-            {"role": "system",
-             "content": "You are a novel text annotation expert. Please strictly add markers to the original text according to the format, and do not use <THINK> tags."},
+            {"role": "system", "content": ANNOTATION_SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ]
-        response = ollama_client.chat(model="mistral:7b", messages=messages)
+        response = get_ollama_client().chat(model=ANNOTATION_MODEL, messages=messages)
         annotated_text = response["message"]["content"]
         annotated_text = clean_ollama_response(annotated_text)
-        return annotated_text
+        # 只缓存模型的成功结果，失败回退的叙述不入缓存
+        if cache is not None:
+            cache.put(cache_key, annotated_text)
+        return annotated_text, True
     except Exception as e:
         print(f"章节分析失败: {str(e)}")
-        return f"[叙述|neutral]{text}"
+        return f"[叙述|neutral]{text}", False
+
+
+def analyze_chapter(text, cache=None, options=None):
+    """
+    调用 LLM 标注章节文本；提供 cache 时命中缓存的块不再调用模型
+    长章节按段落切块并发标注，结果按原顺序拼接；某一块失败时只有该块回退为叙述。
+    """
+    options = options or {}
+    windows = split_into_windows(text, options.get("chunk_chars", ANNOTATION_CHUNK_CHARS),
+                                 options.get("overlap", ANNOTATION_CHUNK_OVERLAP))
+    if len(windows) == 1:
+        return annotate_window(text, cache=cache)[0]
+
+    workers = min(len(windows), options.get("workers", ANNOTATION_CHUNK_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ollama-chunk') as pool:
+        results = list(pool.map(lambda window: annotate_window(window[1], window[0], cache), windows))
+    failed = sum(1 for _, ok in results if not ok)
+    if failed:
+        print(f"分块标注: {len(windows)} 块中 {failed} 块失败，已回退为叙述")
+    return '\n'.join(annotated for annotated, _ in results)
 
 
 def parse_annotated_text(annotated_text):
+    """解析标注文本，返回 AnnotationSegment 列表（单遍扫描，见 iter_annotated_segments）"""
     try:
-        annotations = []
-        lines = annotated_text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            pattern = r'\[([^|\]]+)\|([^\]]+)\](.*)'
-            match = re.match(pattern, line)
-            if match:
-                speaker_or_type = match.group(1)
-                emotion = match.group(2)
-                content = match.group(3).strip()
-                if speaker_or_type == "叙述":
-                    anno_type = "narration"
-                    speaker = "Narrator"
-                else:
-                    anno_type = "dialogue"
-                    speaker = speaker_or_type
-                annotations.append({
-                    "type": anno_type,
-                    "speaker": speaker,
-                    "text": content,
-                    "emotion": emotion.lower()
-                })
-            else:
-                if line.strip():
-                    annotations.append({
-                        "type": "narration",
-                        "speaker": "Narrator",
-                        "text": line,
-                        "emotion": "neutral"
-                    })
-        return annotations
+        return list(iter_annotated_segments(annotated_text))
     except Exception as e:
         print(f"解析标注文本失败: {str(e)}")
         return []
 
 
-def annotate_text(chapters, output_dir):
+def annotate_chapter(chapter_file, annotations_dir, annotation_cache=None, annotation_options=None):
+    """标注单个章节，返回 (章节编号, 标注结果)"""
+    with open(chapter_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    chapter_num = os.path.basename(chapter_file).split('.')[0]
+    print(f"分析章节：{chapter_num}")
+    annotated_text = analyze_chapter(text, cache=annotation_cache, options=annotation_options)
+    annotated_file = os.path.join(annotations_dir, f'{chapter_num}_annotated.txt')
+    with open(annotated_file, 'w', encoding='utf-8') as f:
+        f.write(annotated_text)
+    result = parse_annotated_text(annotated_text)
+    store_file = os.path.join(annotations_dir, f'{chapter_num}{STORE_SUFFIX}')
+    try:
+        write_annotation_store(store_file, result)
+        stored = True
+    except ValueError as e:
+        # emotion / speaker 是模型自由输出的，种类过多时该章节只保存 JSON（同时删掉旧的二进制标注，避免被优先读取）
+        print(f"⚠️ 无法写入二进制标注，改为只保存 JSON: {e}")
+        if os.path.exists(store_file):
+            os.remove(store_file)
+        stored = False
+    # JSON 只作为便于查看的导出格式，重新混音时读取的是二进制标注（二进制写入失败时则读取 JSON）
+    if not stored or (annotation_options or {}).get("json_export", True):
+        anno_file = os.path.join(annotations_dir, f'{chapter_num}.json')
+        with open(anno_file, 'w', encoding='utf-8') as f:
+            json.dump([segment.to_dict() for segment in result], f, ensure_ascii=False, indent=2)
+    return chapter_num, result
+
+
+def annotate_text(chapters, output_dir, annotation_cache=None, annotation_options=None):
     try:
         annotations_dir = os.path.join(output_dir, 'annotations')
         os.makedirs(annotations_dir, exist_ok=True)
         annotations = {}
         for chapter_file in chapters:
-            with open(chapter_file, 'r', encoding='utf-8') as f:
-                text = f.read()
-            chapter_num = os.path.basename(chapter_file).split('.')[0]
-            print(f"分析章节：{chapter_num}")
-            annotated_text = analyze_chapter(text)
-            annotated_file = os.path.join(annotations_dir, f'{chapter_num}_annotated.txt')
-            with open(annotated_file, 'w', encoding='utf-8') as f:
-                f.write(annotated_text)
-            result = parse_annotated_text(annotated_text)
-            anno_file = os.path.join(annotations_dir, f'{chapter_num}.json')
-            with open(anno_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            chapter_num, result = annotate_chapter(chapter_file, annotations_dir, annotation_cache,
+                                                   annotation_options)
             annotations[chapter_num] = result
         print("文本标注完成")
         return annotations
@@ -220,25 +318,154 @@ def annotate_text(chapters, output_dir):
         raise
 
 
-def check_transcription(audio_file, original_text, whisper_model, threshold=0.1):
-    try:
+def transcribe_segments_batch(segments, whisper_model, threshold=0.1, gap_seconds=0.5):
+    """
+    一次 Whisper 转录校验多个片段
+    将片段音频按已知偏移拼接（中间插入静音），带词级时间戳转录一次，
+    再按时间把识别出的词分配回各片段，逐段计算 WER。
+    segments: [(audio_file, original_text), ...]
+    返回 [(is_ok, wer), ...]，顺序与 segments 一致
+    """
+    results = [(False, float('inf'))] * len(segments)
+    sample_rate = whisper.audio.SAMPLE_RATE
+    gap = np.zeros(int(gap_seconds * sample_rate), dtype=np.float32)
+
+    pieces = []
+    spans = []  # (片段下标, 起始秒, 结束秒)
+    cursor = 0
+    for index, (audio_file, _) in enumerate(segments):
         if not os.path.exists(audio_file) or os.path.getsize(audio_file) == 0:
-            return False, float('inf')
-        result = whisper_model.transcribe(audio_file, language="en")
-        transcribed_text = result["text"]
-        original_clean = normalize_text(original_text)
-        transcribed_clean = normalize_text(transcribed_text)
+            continue
+        try:
+            audio = whisper.load_audio(audio_file)
+        except Exception as e:
+            print(f"转录失败 {audio_file}: {str(e)}")
+            continue
+        spans.append((index, cursor / sample_rate, (cursor + len(audio)) / sample_rate))
+        pieces.extend([audio, gap])
+        cursor += len(audio) + len(gap)
+    if not spans:
+        return results
+
+    try:
+        with _whisper_lock:
+            result = whisper_model.transcribe(np.concatenate(pieces), language="en", word_timestamps=True,
+                                              condition_on_previous_text=False)
+    except Exception as e:
+        print(f"批量转录失败: {str(e)}")
+        return results
+
+    words_by_segment = {index: [] for index, _, _ in spans}
+    span_starts = [start for _, start, _ in spans]
+    for whisper_segment in result.get("segments", []):
+        for word in whisper_segment.get("words", []):
+            middle = (word["start"] + word["end"]) / 2
+            # 落在片段之后静音间隔内的词归入前一个片段
+            position = max(bisect.bisect_right(span_starts, middle) - 1, 0)
+            words_by_segment[spans[position][0]].append(word["word"])
+
+    for index, words in words_by_segment.items():
+        original_clean = normalize_text(segments[index][1])
+        transcribed_clean = normalize_text(''.join(words))
         if not original_clean or not transcribed_clean:
-            return True, 0.0
+            results[index] = (True, 0.0)
+            continue
         wer = jiwer.wer(original_clean, transcribed_clean)
-        return wer <= threshold, wer
-    except Exception as e:
-        print(f"转录失败 {audio_file}: {str(e)}")
-        return False, float('inf')
+        results[index] = (wer <= threshold, wer)
+    return results
+
+
+def build_verification_options(config):
+    """从配置中读取 Whisper 抽样校验参数"""
+    return {
+        "sample_rate": float(config.get('whisper_sample_rate', 1.0)),
+        "mode": config.get('whisper_sample_mode', 'stratified'),
+        "long_segment_chars": int(config.get('whisper_long_segment_chars', 300)),
+        "rare_speaker_max": int(config.get('whisper_rare_speaker_max', 3)),
+    }
+
+
+def select_segments_for_verification(segments, sample_rate, mode='stratified', long_segment_chars=300,
+                                     rare_speaker_max=3, speaker_counts=None, seed=None):
+    """
+    选出需要 Whisper 校验的片段下标
+    segments: [(output_file, text, speaker), ...]
+    - random: 在全部片段中随机抽取 sample_rate 比例
+    - stratified: 在每个 speaker 内分别抽取 sample_rate 比例（至少 1 段）
+    长片段 (>= long_segment_chars) 和稀有 speaker（出现次数 <= rare_speaker_max）的片段总是校验。
+    sample_rate <= 0 表示完全禁用校验，>= 1 表示全部校验。
+    """
+    if sample_rate <= 0 or not segments:
+        return set()
+    if sample_rate >= 1:
+        return set(range(len(segments)))
+
+    rng = random.Random(seed)
+    if speaker_counts is None:
+        speaker_counts = Counter(speaker for _, _, speaker in segments)
+
+    selected = set()
+    by_speaker = {}
+    for index, (_, text, speaker) in enumerate(segments):
+        if len(text) >= long_segment_chars or speaker_counts.get(speaker, 0) <= rare_speaker_max:
+            selected.add(index)
+        by_speaker.setdefault(speaker, []).append(index)
+
+    if mode == 'random':
+        sample_size = math.ceil(len(segments) * sample_rate)
+        selected.update(rng.sample(range(len(segments)), sample_size))
+    else:
+        for speaker in sorted(by_speaker):
+            indices = by_speaker[speaker]
+            selected.update(rng.sample(indices, max(1, math.ceil(len(indices) * sample_rate))))
+    return selected
 
 
-def create_speaker_mapper(tts, role_to_speaker):
-    available_speakers = list(tts.synthesizer.tts_model.speaker_manager.speakers.keys())
+def verify_chapter_segments(chapter_num, segments, whisper_model, threshold=0.1, verification=None,
+                            speaker_counts=None, on_rejected=None):
+    """
+    对章节内新合成的片段进行 Whisper 校验
+    先按抽样策略校验部分片段；若抽样平均 WER 超过阈值，则升级为校验整章剩余片段。
+    WER 超过阈值的片段以 (text, speaker) 调用 on_rejected（用于从片段音频缓存中移除）。
+    返回 {output_file: wer}
+    """
+    if verification is None:
+        selected = set(range(len(segments)))
+    else:
+        selected = select_segments_for_verification(
+            segments, verification['sample_rate'], verification['mode'], verification['long_segment_chars'],
+            verification['rare_speaker_max'], speaker_counts=speaker_counts, seed=chapter_num)
+        if len(selected) < len(segments):
+            print(f"🔍 章节 {chapter_num} 抽样校验 {len(selected)}/{len(segments)} 个片段")
+
+    def _check(indices):
+        checked = {}
+        indices = sorted(indices)
+        batch = [(segments[index][0], segments[index][1]) for index in indices]
+        for index, (is_ok, wer) in zip(indices, transcribe_segments_batch(batch, whisper_model, threshold)):
+            output_file, text, speaker = segments[index]
+            if not is_ok:
+                print(f"⚠️ 转录不匹配 {output_file}, WER: {wer:.3f}")
+                if on_rejected is not None:
+                    on_rejected(text, speaker)
+            else:
+                print(f"✅ 校验通过 {output_file}, WER: {wer:.3f}")
+            checked[output_file] = wer
+        return checked
+
+    results = _check(selected)
+    remaining = set(range(len(segments))) - selected
+    if results and remaining:
+        mean_wer = sum(min(wer, 1.0) for wer in results.values()) / len(results)
+        if mean_wer > threshold:
+            print(f"⚠️ 章节 {chapter_num} 抽样平均 WER {mean_wer:.3f} 超过阈值 {threshold}，升级为全量校验")
+            results.update(_check(remaining))
+    return results
+
+
+def create_speaker_mapper(tts, role_to_speaker, available_speakers=None):
+    if available_speakers is None:
+        available_speakers = list(tts.synthesizer.tts_model.speaker_manager.speakers.keys())
     print(f"可用的 speakers: {available_speakers}")
     speaker_mapping_cache = {}
 
@@ -259,15 +486,19 @@ def create_speaker_mapper(tts, role_to_speaker):
 
 
 def synthesize_tts(chapter_file, annotations, role_to_speaker, output_dir, tts, whisper_model, threshold=0.1,
-                   force_rebuild=False):
+                   force_rebuild=False, engine=None, get_valid_speaker=None, verification=None, verifier=None):
     try:
-        get_valid_speaker = create_speaker_mapper(tts, role_to_speaker)
+        if get_valid_speaker is None:
+            get_valid_speaker = create_speaker_mapper(tts, role_to_speaker)
+        if engine is None:
+            engine = XttsSynthesisEngine(tts)
         chapter_num = os.path.basename(chapter_file).split('.')[0]
         print(f"开始合成章节: {chapter_num}")
 
         chapter_audio_dir = os.path.join(output_dir, 'chapters')
         os.makedirs(chapter_audio_dir, exist_ok=True)
 
+        pending = []
         for i, anno in enumerate(annotations):
             text = anno.get('text', '')
             role = anno.get('speaker', 'Narrator')
@@ -292,20 +523,33 @@ def synthesize_tts(chapter_file, annotations, role_to_speaker, output_dir, tts,
                 except OSError as e:
                     print(f"⚠️ 删除文件失败 {output_file}: {e}")
 
-            try:
-                tts.tts_to_file(text=text, speaker=speaker, language="en", file_path=output_file)
-                print(f"🔊 合成完成: {output_file}")
-            except Exception as e:
-                print(f"TTS 合成失败 {output_file}: {str(e)}")
-                continue
+            pending.append((output_file, text, speaker))
 
-            is_ok, wer = check_transcription(output_file, text, whisper_model, threshold)
-            if not is_ok:
-                print(f"⚠️ 转录不匹配 {output_file}, WER: {wer:.3f}")
-            else:
-                print(f"✅ 校验通过 {output_file}, WER: {wer:.3f}")
+        # 按 speaker 分组批量合成，条件潜变量每个 speaker 只计算一次；
+        # 强制重建时不读片段音频缓存，重新合成后覆盖缓存
+        errors = engine.synthesize_to_files(pending, refresh=force_rebuild)
+
+        synthesized = []
+        for output_file, text, speaker in pending:
+            error = errors.get(output_file)
+            if error is not None:
+                print(f"TTS 合成失败 {output_file}: {str(error)}")
+                continue
+            print(f"🔊 合成完成: {output_file}")
+            synthesized.append((output_file, text, speaker))
+
+        speaker_counts = Counter(get_valid_speaker(anno.get('speaker', 'Narrator')) for anno in annotations)
+        verify_future = None
+        if verifier is not None:
+            # 交给独立的校验线程，合成不必等待 Whisper
+            verify_future = verifier.submit(verify_chapter_segments, chapter_num, synthesized, whisper_model,
+                                            threshold, verification, speaker_counts, engine.invalidate)
+        else:
+            verify_chapter_segments(chapter_num, synthesized, whisper_model, threshold, verification,
+                                    speaker_counts, engine.invalidate)
 
         print(f"✅ 章节 {chapter_num} TTS 合成完成")
+        return verify_future
     except Exception as e:
         print(f"TTS 合成过程出错: {str(e)}")
         raise
@@ -327,7 +571,7 @@ def find_existing_wav_files(chapter_audio_dir, chapter_formatted):
     return wav_files
 
 
-def mix_audio(annotations, output_dir, effect_dir, role_to_speaker=None, force_rebuild=False):
+def mix_audio(annotations, output_dir, effect_dir, role_to_speaker=None, force_rebuild=False, streaming=False):
     try:
         print("开始音效混音")
         chapter_audio_dir = os.path.join(output_dir, 'chapters')
@@ -370,26 +614,17 @@ def mix_audio(annotations, output_dir, effect_dir, role_to_speaker=None, force_r
 
             # 首先检查是否已存在wav文件，如果存在则直接使用
             existing_wav_files = find_existing_wav_files(chapter_audio_dir, chapter_formatted)
+            wav_files = []
             if existing_wav_files :
                 print(f"  -> 发现 {len(existing_wav_files)} 个已存在的wav文件，直接使用")
-                chapter_audio = AudioSegment.silent(duration=0)
-
                 for wav_file in existing_wav_files:
                     if os.path.exists(wav_file) and os.path.getsize(wav_file) > 0:
-                        try:
-                            audio = AudioSegment.from_wav(wav_file)
-                            chapter_audio += audio + AudioSegment.silent(duration=200)
-                            print(f"  -> 已添加: {os.path.basename(wav_file)}")
-                        except Exception as e:
-                            print(f"  -> 加载音频失败 {wav_file}: {str(e)}")
-                            continue
+                        wav_files.append(wav_file)
                     else:
                         print(f"  -> 跳过无效文件: {wav_file}")
             else:
                 # 如果没有现有wav文件，则按原有逻辑生成
                 print(f"  -> 未发现现有wav文件，按原有逻辑生成")
-                chapter_audio = AudioSegment.silent(duration=0)
-
                 for i, anno in enumerate(anno_list):
                     # 保持现有格式：使用实际的speaker名称作为角色名
                     role = anno.get('speaker', 'Narrator')
@@ -399,35 +634,29 @@ def mix_audio(annotations, output_dir, effect_dir, role_to_speaker=None, force_r
                     if not os.path.exists(audio_file):
                         print(f"❌ 音频文件不存在，跳过: {audio_file}")
                         continue
-                    try:
-                        audio = AudioSegment.from_wav(audio_file)
-                        chapter_audio += audio + AudioSegment.silent(duration=200)
-                    except Exception as e:
-                        print(f"加载音频失败 {audio_file}: {str(e)}")
-                        continue
+                    wav_files.append(audio_file)
 
-            if len(chapter_audio) == 0:
-                print(f"⚠️ 章节 {chapter_formatted} 无有效音频数据，跳过导出")
-                continue
+            effect_file = find_background_effect(effect_dir)
+            if effect_file is None:
+                print("🟡 未添加背景音效")
 
-            bg_added = False
-            effect_file = os.path.join(effect_dir, 'background.wav')
-            if not os.path.exists(effect_file):
-                for fallback in ['forest.wav', 'ambient.wav', 'music.wav']:
-                    fallback_file = os.path.join(effect_dir, fallback)
-                    if os.path.exists(fallback_file):
-                        effect_file = fallback_file
-                        break
-            if os.path.exists(effect_file):
+            if streaming:
+                # 流式模式：边混音边通过管道送入 ffmpeg 编码，内存占用与章节长度无关
                 try:
-                    bg_audio = AudioSegment.from_wav(effect_file) - 15
-                    chapter_audio = chapter_audio.overlay(bg_audio, loop=True)
-                    bg_added = True
+                    if not stream_chapter_to_mp3(wav_files, final_output_file, effect_file, bitrate='192k'):
+                        print(f"⚠️ 章节 {chapter_formatted} 无有效音频数据，跳过导出")
+                        continue
+                    print(f"✅ 混音完成: {final_output_file}")
                 except Exception as e:
-                    print(f"加载背景音效失败 {effect_file}: {str(e)}")
+                    print(f"❌ 导出音频失败 {final_output_file}: {str(e)}")
+                continue
 
-            if not bg_added:
-                print("🟡 未添加背景音效")
+            # 预分配缓冲区一次性拼接片段并叠加背景音效
+            chapter_audio = mix_chapter_segments(wav_files, effect_file)
+
+            if chapter_audio is None or len(chapter_audio) == 0:
+                print(f"⚠️ 章节 {chapter_formatted} 无有效音频数据，跳过导出")
+                continue
 
             try:
                 chapter_audio.export(final_output_file, format='mp3', bitrate='192k')
@@ -468,7 +697,127 @@ def find_last_completed_chapter(output_dir, total_chapters):
     return 0
 
 
-def generate_audiobook(input_directory, input_file_path, config_path='config.yaml', force_rebuild=False):
+def assign_speakers(role_to_speaker, anno_list, available_speakers):
+    """为标注中新出现的对话角色轮流分配可用的 speaker"""
+    speaker_index = len([role for role in role_to_speaker if role not in ("Narrator", "Unknown")])
+    for anno in anno_list:
+        speaker = anno.get('speaker')
+        if anno.get('type') == 'dialogue' and speaker and speaker not in role_to_speaker:
+            role_to_speaker[speaker] = available_speakers[speaker_index % len(available_speakers)]
+            speaker_index += 1
+    return role_to_speaker
+
+
+def create_tts_worker_pool(config):
+    """
+    按 tts_worker_processes 创建多进程 TTS 副本池（auto 或进程数）
+    同一会话内相同配置的池只启动一次；未开启或启动失败时返回 None，由调用方改用进程内合成。
+    """
+    processes = config.get('tts_worker_processes', 0)
+    if processes != 'auto':
+        processes = int(processes or 0)
+        if processes <= 0:
+            return None
+    threads_per_process = int(config.get('tts_threads_per_process', TTS_THREADS_PER_PROCESS))
+    replica_memory_mb = int(config.get('tts_replica_memory_mb', TTS_REPLICA_MEMORY_MB))
+    options = {
+        "latent_dir": config.get('speaker_latent_dir', 'cache/speaker_latents'),
+        "voice_dir": config.get('speaker_voice_dir'),
+        "cache_dir": config.get('audio_cache_dir', 'cache/audio_segments'),
+        "cache_max_entries": config.get('audio_cache_max_entries', 200000),
+        "cache_max_bytes": config.get('audio_cache_max_mb', 2048) * 1024 * 1024,
+    }
+
+    def _create():
+        slots = plan_tts_workers(processes, threads_per_process, replica_memory_mb)
+        print(f"启动 {len(slots)} 个 TTS 工作进程: {', '.join(f'{device}×{threads}线程' for device, threads in slots)}")
+        return TtsWorkerPool(slots, options)
+
+    key = (processes, threads_per_process, replica_memory_mb, tuple(sorted(options.items())))
+    try:
+        return get_tts_worker_pool(key, _create)
+    except Exception as e:
+        print(f"⚠️ 启动 TTS 工作进程失败，改用进程内合成: {e}")
+        return None
+
+
+def process_chapters_pipeline(chapters, start_index, annotations_dir, synthesize_chapter, mix_chapter,
+                              on_annotated=None, max_workers_ollama=2, max_workers_tts=2,
+                              annotation_cache=None, annotation_options=None, before_synthesis=None):
+    """
+    分阶段流水线处理章节：标注 -> TTS 合成 -> 混音
+    第 N+1 章标注的同时第 N 章在合成、第 N-1 章在混音，各阶段使用独立的线程池。
+    标注结果按章节顺序消费，start_index 之前的章节只标注不合成。
+    提供 before_synthesis 时先等全部章节标注完成，以待合成章节的 {章节编号: 标注结果} 调用一次，再开始合成。
+    返回按章节顺序排列的 {章节编号: 标注结果}
+    """
+    annotations = {}
+    stage_futures = []
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='mix') as mix_pool, \
+            ThreadPoolExecutor(max_workers=max_workers_tts, thread_name_prefix='tts') as tts_pool, \
+            ThreadPoolExecutor(max_workers=max_workers_ollama, thread_name_prefix='ollama') as anno_pool:
+        anno_futures = [anno_pool.submit(annotate_chapter, chapter_file, annotations_dir, annotation_cache,
+                                         annotation_options)
+                        for chapter_file in chapters]
+
+        def _submit_mix(tts_future, chapter_num, anno_list):
+            if tts_future.cancelled() or tts_future.exception() is not None:
+                return
+            stage_futures.append(mix_pool.submit(mix_chapter, chapter_num, anno_list))
+
+        def _annotated():
+            for index, (chapter_file, anno_future) in enumerate(zip(chapters, anno_futures)):
+                chapter_num, anno_list = anno_future.result()
+                annotations[chapter_num] = anno_list
+                if on_annotated is not None:
+                    on_annotated(chapter_num, anno_list)
+                yield index, chapter_file, chapter_num, anno_list
+
+        try:
+            annotated = _annotated()
+            if before_synthesis is not None:
+                # 屏障：整本书标注完成后才开始合成
+                annotated = list(annotated)
+                before_synthesis(OrderedDict((chapter_num, anno_list)
+                                             for index, _, chapter_num, anno_list in annotated
+                                             if index >= start_index))
+            for index, chapter_file, chapter_num, anno_list in annotated:
+                if index < start_index:
+                    continue
+                print(f"开始处理章节 {index + 1}/{len(chapters)}: {chapter_num}")
+                tts_future = tts_pool.submit(synthesize_chapter, chapter_file, chapter_num, anno_list)
+                stage_futures.append(tts_future)
+                tts_future.add_done_callback(
+                    lambda f, num=chapter_num, annos=anno_list: _submit_mix(f, num, annos))
+        except Exception:
+            for future in anno_futures:
+                future.cancel()
+            raise
+
+    for future in list(stage_futures):
+        if future.exception() is not None:
+            raise future.exception()
+    return annotations
+
+
+def generate_audiobook(input_directory, input_file_path, config_path='config.yaml', force_rebuild=False,
+                       update_rss=True):
+    """
+    生成单本有声书
+    模型在 model_session 作用域内加载：单独调用时结束后释放；
+    在外层会话（如批量生成）中调用时复用已加载的模型。
+    update_rss=False 时跳过生成后的 RSS 更新（由调用方统一发布）。
+    """
+    with model_session():
+        return _generate_audiobook(input_directory, input_file_path, config_path, force_rebuild, update_rss)
+
+
+def _generate_audiobook(input_directory, input_file_path, config_path='config.yaml', force_rebuild=False,
+                        update_rss=True):
+    # 缓存连接和 Whisper 校验线程在 finally 中释放：批量生成和编排器在同一个 model_session 中逐本调用，
+    # 某本书出错时不能把它们遗留给后面的书
+    annotation_cache = audio_cache = verifier = None
     try:
         base_output_dir = os.path.dirname(input_file_path)
         story_title = os.path.splitext(os.path.basename(input_file_path))[0]
@@ -483,9 +832,12 @@ def generate_audiobook(input_directory, input_file_path, config_path='config.yam
         config['input_file'] = input_file_path
         config['output_dir'] = output_dir
 
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
-        whisper_model = whisper.load_model(config.get('whisper_model', 'base'))
+        max_workers_ollama = max(1, int(config.get('max_workers_ollama', 1)))
+        max_workers_tts = max(1, int(config.get('max_workers_tts', 1)))
+
+        annotation_cache = AnnotationCache(config.get('annotation_cache_dir', 'cache/annotations'),
+                                           max_entries=config.get('annotation_cache_max_entries', 5000),
+                                           max_bytes=config.get('annotation_cache_max_mb', 512) * 1024 * 1024)
 
         chapters = extract_chapters(config['input_file'], config['output_dir'])
 
@@ -502,47 +854,106 @@ def generate_audiobook(input_directory, input_file_path, config_path='config.yam
             print("所有章节均已生成完成，无需重复生成")
             return
 
-        # 只对需要生成的章节进行处理
-        chapters_to_process = chapters[start_index:]
-
-        # 如果需要重新处理注释（因为可能需要全部章节的注释）
-        annotations = annotate_text(chapters, config['output_dir'])
-
-        all_speakers = {"Narrator"}
-        for anno_list in annotations.values():
-            for anno in anno_list:
-                if anno.get('type') == 'dialogue' and anno.get('speaker'):
-                    all_speakers.add(anno['speaker'])
-        available_speakers = list(tts.synthesizer.tts_model.speaker_manager.speakers.keys())
+        # 片段音频缓存按内容寻址，与片段序号无关，所有合成引擎共享
+        audio_cache = SegmentAudioCache(config.get('audio_cache_dir', 'cache/audio_segments'),
+                                        max_entries=config.get('audio_cache_max_entries', 200000),
+                                        max_bytes=config.get('audio_cache_max_mb', 2048) * 1024 * 1024)
+        # Whisper 先于 TTS 副本池加载：按空闲显存规划副本数时已扣除 Whisper 的实际占用
+        whisper_model = get_whisper_model(config.get('whisper_model', 'base'))
+        tts_engines = queue.Queue()
+        tts_pool = create_tts_worker_pool(config)
+        if tts_pool is not None:
+            # 模型副本在工作进程中，各章节的合成线程共用同一个副本池
+            for _ in range(max_workers_tts):
+                tts_engines.put(tts_pool)
+            pool_counts = tts_pool.cache_counts()
+        else:
+            # 模型从进程内注册表获取，同一会话中的多本书只加载一次
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            # 所有合成引擎共享同一个 speaker 潜变量存储（磁盘部分可跨进程、跨书共享）
+            latent_store = SpeakerLatentStore(config.get('speaker_latent_dir', 'cache/speaker_latents'),
+                                              voice_dir=config.get('speaker_voice_dir'))
+            # 每个 TTS 工作线程独占一个模型实例及其合成引擎
+            for tts_model in get_tts_models(max_workers_tts, device):
+                tts_engines.put(XttsSynthesisEngine(tts_model, latent_store=latent_store, audio_cache=audio_cache))
+
+        available_speakers = tts_engines.queue[0].available_speakers
         role_to_speaker = {
             "Narrator": config.get('narrator_speaker', available_speakers[0] if available_speakers else "default"),
             "Unknown": config.get('narrator_speaker', available_speakers[0] if available_speakers else "default")
         }
-        speaker_index = 0
-        for speaker in all_speakers:
-            if speaker not in role_to_speaker:
-                role_to_speaker[speaker] = available_speakers[speaker_index % len(available_speakers)]
-                speaker_index += 1
-
-        # 只处理需要生成的章节
-        for i, (chapter_file, anno_list) in enumerate(
-                zip(chapters_to_process, list(annotations.values())[start_index:])):
-            actual_index = start_index + i
-            chapter_num = f'chapter_{actual_index + 1:02d}'
-            print(f"开始处理章节 {actual_index + 1}/{len(chapters)}: {chapter_num}")
 
+        verification = build_verification_options(config)
+        # Whisper 校验在独立线程中进行，与后续章节的合成重叠
+        verifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix='whisper')
+        verify_futures = []
+        # speaker 映射整本书只构建一次
+        get_valid_speaker = create_speaker_mapper(None, role_to_speaker, available_speakers)
+
+        def on_annotated(chapter_num, anno_list):
+            assign_speakers(role_to_speaker, anno_list, available_speakers)
+
+        def synthesize_chapter(chapter_file, chapter_num, anno_list):
             # 检查章节是否已完成（双重保险）
             if not force_rebuild and get_chapter_status(output_dir, chapter_num):
                 print(f"章节 {chapter_num} 已存在，跳过")
-                continue
-
-            synthesize_tts(chapter_file, anno_list, role_to_speaker, config['output_dir'], tts, whisper_model,
-                           config.get('whisper_threshold', 0.1), force_rebuild=force_rebuild)
-
-        # 混音处理也可以添加断点逻辑
-        annotations_subset = dict(list(annotations.items())[start_index:])
-        mix_audio(annotations_subset, config['output_dir'], config.get('effect_dir', 'effects'),
-                  role_to_speaker, force_rebuild=force_rebuild)
+                return
+            engine = tts_engines.get()
+            try:
+                verify_future = synthesize_tts(chapter_file, anno_list, role_to_speaker, config['output_dir'],
+                                               engine.tts, whisper_model, config.get('whisper_threshold', 0.1),
+                                               force_rebuild=force_rebuild, engine=engine,
+                                               get_valid_speaker=get_valid_speaker, verification=verification,
+                                               verifier=verifier)
+            finally:
+                tts_engines.put(engine)
+            if verify_future is not None:
+                verify_futures.append(verify_future)
+
+        dedup_options = build_dedup_options(config)
+
+        def precompute_repeated(pending_annotations):
+            # 取出全部引擎并行预合成重复短句，结束后归还
+            engines = [tts_engines.get() for _ in range(max_workers_tts)]
+            try:
+                precompute_repeated_segments(pending_annotations, engines, get_valid_speaker, dedup_options,
+                                             report_path=os.path.join(config['output_dir'], DEDUP_REPORT_FILE))
+            finally:
+                for engine in engines:
+                    tts_engines.put(engine)
+
+        def mix_chapter(chapter_num, anno_list):
+            mix_audio({chapter_num: anno_list}, config['output_dir'], config.get('effect_dir', 'effects'),
+                      role_to_speaker, force_rebuild=force_rebuild,
+                      streaming=config.get('streaming_export', False))
+
+        # 标注、合成、混音三个阶段流水线并行
+        annotations_dir = os.path.join(config['output_dir'], 'annotations')
+        os.makedirs(annotations_dir, exist_ok=True)
+        annotations = process_chapters_pipeline(chapters, start_index, annotations_dir, synthesize_chapter,
+                                                mix_chapter, on_annotated=on_annotated,
+                                                max_workers_ollama=max_workers_ollama,
+                                                max_workers_tts=max_workers_tts,
+                                                annotation_cache=annotation_cache,
+                                                annotation_options=build_annotation_options(config),
+                                                before_synthesis=precompute_repeated if dedup_options else None)
+        print("✅ 音效混音完成")
+        verifier.shutdown(wait=True)
+        for future in verify_futures:
+            if future.exception() is not None:
+                print(f"⚠️ Whisper 校验出错: {future.exception()}")
+        cache_stats = annotation_cache.stats()
+        print(f"📦 标注缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}，"
+              f"共 {cache_stats['entries']} 条")
+        logger.info(f"标注缓存统计: {cache_stats}")
+        audio_stats = audio_cache.stats()
+        if tts_pool is not None:
+            # 副本池模式下缓存在工作进程中命中，统计本书期间副本池累计的增量
+            hits, misses = tts_pool.cache_counts()
+            audio_stats.update(hits=hits - pool_counts[0], misses=misses - pool_counts[1])
+        print(f"🔁 片段音频缓存: 命中 {audio_stats['hits']} / 未命中 {audio_stats['misses']}，"
+              f"共 {audio_stats['entries']} 条")
+        logger.info(f"片段音频缓存统计: {audio_stats}")
 
         manifest = {
             "chapters": [
@@ -559,13 +970,14 @@ def generate_audiobook(input_directory, input_file_path, config_path='config.yam
         print("✅ 元数据生成完成")
         logger.info("✅ 元数据生成完成"+input_directory)
 
-        try:
-            from generate_and_deploy_rss import run_rss_update_process
-            run_rss_update_process(input_directory)
-            print("✅ RSS 更新完成")
-        except Exception as rss_error:
-            print(f"❌ 调用 RSS 更新脚本时出错: {rss_error}")
-            logger.error(f"❌ 调用 RSS 更新脚本时出错: {rss_error}")
+        if update_rss:
+            try:
+                from generate_and_deploy_rss import run_rss_update_process
+                run_rss_update_process(input_directory)
+                print("✅ RSS 更新完成")
+            except Exception as rss_error:
+                print(f"❌ 调用 RSS 更新脚本时出错: {rss_error}")
+                logger.error(f"❌ 调用 RSS 更新脚本时出错: {rss_error}")
 
         print(f"✅ === 有声书生成完成: {story_title} ===")
         logger.info(f"✅ === 有声书生成完成: {story_title} ===")
@@ -575,3 +987,10 @@ def generate_audiobook(input_directory, input_file_path, config_path='config.yam
         import traceback
         traceback.print_exc()
         raise
+    finally:
+        if verifier is not None:
+            verifier.shutdown(wait=True, cancel_futures=True)
+        if annotation_cache is not None:
+            annotation_cache.close()
+        if audio_cache is not None:
+            audio_cache.close()
@@ -4,6 +4,8 @@ from pathlib import Path
 import glob
 import sys
 from audiobook_generator import generate_audiobook
+from model_registry import model_session
+from annotation_store import load_annotations
 
 
 def verify_audiobook_generation(input_directory, txt_file_path):
@@ -82,30 +84,19 @@ def check_and_rebuild_if_needed(input_directory, txt_file_path, config_path='con
                 config['output_dir'] = str(output_dir)
 
                 # 尝试重新混音
-                # 需要读取annotations文件来重新混音
+                # 优先读取二进制标注（mmap 按需解码），没有时回退到 JSON
                 annotations_dir = output_dir / "annotations"
-                annotations = {}
-
-                # 读取所有章节的注解文件
-                for anno_file in annotations_dir.glob("chapter_*.json"):
-                    chapter_num = anno_file.stem
-                    try:
-                        import json
-                        with open(anno_file, 'r', encoding='utf-8') as f:
-                            annotations[chapter_num] = json.load(f)
-                    except Exception as e:
-                        print(f"  -> 读取注解文件失败 {anno_file}: {e}")
-                        continue
-
-                if annotations:
-                    # 重新混音
-                    from audiobook_generator import mix_audio
-                    mix_audio(annotations, str(output_dir), config.get('effect_dir', 'effects'), force_rebuild=True)
-                    print(f"  -> 重新混音完成")
-                    return True
-                else:
-                    print(f"  -> 未找到注解文件，无法重新混音")
-                    return False
+                if annotations_dir.is_dir():
+                    # 章节在混音时才逐个打开，同时打开的数量有上限
+                    with load_annotations(str(annotations_dir)) as annotations:
+                        if annotations:
+                            # 重新混音
+                            mix_audio(annotations, str(output_dir), config.get('effect_dir', 'effects'),
+                                      force_rebuild=True, streaming=config.get('streaming_export', False))
+                            print(f"  -> 重新混音完成")
+                            return True
+                print(f"  -> 未找到注解文件，无法重新混音")
+                return False
 
             except Exception as e:
                 print(f"  -> 重新混音失败: {e}")
@@ -120,7 +111,7 @@ def check_and_rebuild_if_needed(input_directory, txt_file_path, config_path='con
 
 
 def generate_audiobooks_in_directory(input_directory: str, config_path: str = 'config.yaml',
-                                     force_rebuild: bool = False):
+                                     force_rebuild: bool = False, update_rss: bool = True):
     """
     批量处理目录中的所有 .txt 文件，为每个文件生成对应的有声书（.mp3）
 
@@ -128,6 +119,7 @@ def generate_audiobooks_in_directory(input_directory: str, config_path: str = 'c
         input_directory (str): 包含 .txt 文件的输入目录
         config_path (str): 配置文件路径
         force_rebuild (bool): 是否强制重新生成所有文件
+        update_rss (bool): 每个文件生成后是否触发 RSS 更新
     """
     input_dir = Path(input_directory)
 
@@ -150,57 +142,10 @@ def generate_audiobooks_in_directory(input_directory: str, config_path: str = 'c
 
     print(f"📁 在目录 '{input_directory}' 中找到 {len(txt_files)} 个 .txt 文件。\n")
 
-    processed_count = 0
-    failed_files = []
-
-    txt_files.sort(key=lambda x: x.name)
-
-    for i, txt_file_path in enumerate(txt_files, 1):
-        # 检查对应的输出目录和最终MP3文件是否存在
-        txt_filename = txt_file_path.stem
-        output_dir_name = f"{txt_filename}_audiobook_output"
-        output_dir = Path(input_directory) / output_dir_name
-        final_mp3 = output_dir / "chapters" / f"{txt_filename}_final.mp3"
-
-        if final_mp3.exists() and not force_rebuild:
-            print(f"✅ ({i}/{len(txt_files)}) 跳过，音频已存在: {final_mp3.name}")
-            processed_count += 1
-            continue
-
-        # 如果不是强制重建，检查是否已完成但需要重新合成
-        if not force_rebuild:
-            is_valid, message = verify_audiobook_generation(str(input_directory), txt_file_path)
-            if is_valid:
-                print(f"✅ ({i}/{len(txt_files)}) 校验通过: {final_mp3.name}")
-                processed_count += 1
-                continue
-            elif "需要重新合成" in message:
-                print(f"🔄 ({i}/{len(txt_files)}) 检测到需要重新合成: {txt_file_path.name}")
-                print(f"   信息: {message}")
-                # 尝试重新合成
-                if check_and_rebuild_if_needed(str(input_directory), txt_file_path, config_path):
-                    print(f"✅ ({i}/{len(txt_files)}) 重新合成成功: {final_mp3.name}")
-                    processed_count += 1
-                    continue
-                else:
-                    print(f"❌ ({i}/{len(txt_files)}) 重新合成失败: {txt_file_path.name}")
-
-        print(f"🔊 ({i}/{len(txt_files)}) 正在处理: {txt_file_path.name}")
-        try:
-            generate_audiobook(str(input_directory), str(txt_file_path), config_path, force_rebuild=force_rebuild)
-            # 验证生成结果
-            is_valid, message = verify_audiobook_generation(str(input_directory), txt_file_path)
-            if is_valid:
-                print(f"✅ ({i}/{len(txt_files)}) 成功生成: {final_mp3.name}")
-                processed_count += 1
-            else:
-                print(f"❌ ({i}/{len(txt_files)}) 生成验证失败: {txt_file_path.name}")
-                print(f"   错误: {message}")
-                failed_files.append(txt_file_path.name)
-        except Exception as e:
-            print(f"❌ ({i}/{len(txt_files)}) 处理失败: {txt_file_path.name}")
-            print(f"   错误: {e}")
-            failed_files.append(txt_file_path.name)
+    # 整个目录在同一个模型会话中处理，TTS / Whisper 模型只加载一次
+    with model_session():
+        processed_count, failed_files = _generate_audiobooks(input_directory, txt_files, config_path, force_rebuild,
+                                                             update_rss)
 
     print(f"\n" + "=" * 60)
     print(f"✅ 批量处理完成: {input_directory}")
@@ -214,6 +159,73 @@ def generate_audiobooks_in_directory(input_directory: str, config_path: str = 'c
     print("=" * 60)
 
 
+def _generate_audiobooks(input_directory, txt_files, config_path, force_rebuild, update_rss=True):
+    """依次为每个 .txt 文件生成有声书，返回 (成功数, 失败文件列表)"""
+    processed_count = 0
+    failed_files = []
+
+    txt_files.sort(key=lambda x: x.name)
+
+    for i, txt_file_path in enumerate(txt_files, 1):
+        if process_txt_file(input_directory, txt_file_path, config_path, force_rebuild, update_rss,
+                            progress=f"{i}/{len(txt_files)}"):
+            processed_count += 1
+        else:
+            failed_files.append(txt_file_path.name)
+
+    return processed_count, failed_files
+
+
+def process_txt_file(input_directory, txt_file_path, config_path='config.yaml', force_rebuild=False,
+                     update_rss=True, progress=""):
+    """
+    为单个 .txt 文件生成有声书（已生成的直接跳过，缺少最终 MP3 的只重新混音），成功返回 True
+    update_rss=False 时不在生成后触发 RSS 更新，由调用方统一处理。
+    """
+    txt_file_path = Path(txt_file_path)
+    # 检查对应的输出目录和最终MP3文件是否存在
+    txt_filename = txt_file_path.stem
+    output_dir_name = f"{txt_filename}_audiobook_output"
+    output_dir = Path(input_directory) / output_dir_name
+    final_mp3 = output_dir / "chapters" / f"{txt_filename}_final.mp3"
+
+    if final_mp3.exists() and not force_rebuild:
+        print(f"✅ ({progress}) 跳过，音频已存在: {final_mp3.name}")
+        return True
+
+    # 如果不是强制重建，检查是否已完成但需要重新合成
+    if not force_rebuild:
+        is_valid, message = verify_audiobook_generation(str(input_directory), txt_file_path)
+        if is_valid:
+            print(f"✅ ({progress}) 校验通过: {final_mp3.name}")
+            return True
+        elif "需要重新合成" in message:
+            print(f"🔄 ({progress}) 检测到需要重新合成: {txt_file_path.name}")
+            print(f"   信息: {message}")
+            # 尝试重新合成
+            if check_and_rebuild_if_needed(str(input_directory), txt_file_path, config_path):
+                print(f"✅ ({progress}) 重新合成成功: {final_mp3.name}")
+                return True
+            else:
+                print(f"❌ ({progress}) 重新合成失败: {txt_file_path.name}")
+
+    print(f"🔊 ({progress}) 正在处理: {txt_file_path.name}")
+    try:
+        generate_audiobook(str(input_directory), str(txt_file_path), config_path, force_rebuild=force_rebuild,
+                           update_rss=update_rss)
+        # 验证生成结果
+        is_valid, message = verify_audiobook_generation(str(input_directory), txt_file_path)
+        if is_valid:
+            print(f"✅ ({progress}) 成功生成: {final_mp3.name}")
+            return True
+        print(f"❌ ({progress}) 生成验证失败: {txt_file_path.name}")
+        print(f"   错误: {message}")
+    except Exception as e:
+        print(f"❌ ({progress}) 处理失败: {txt_file_path.name}")
+        print(f"   错误: {e}")
+    return False
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("📌 用法: python batch_audiobook_generator.py <input_directory> [config_path] [force_rebuild]")
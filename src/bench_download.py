@@ -0,0 +1,195 @@
+# bench_download.py (对本地替身服务器运行下载流程：目录获取与章节抓取的端到端检查)
+import os
+import re
+import sys
+import gzip
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from wattpad_extract import extract_chapter_page
+from status_store import StatusStore
+from wattpad_downloader import StorySession, get_story_toc, download_chapter_content, chapter_file_path
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'wattpad')
+# 样本中接口返回的章节地址指向真实站点，替身服务器返回前改写为自身地址
+FIXTURE_ORIGIN = 'https://www.wattpad.com'
+# 替身服务器不需要真实站点的请求间隔
+BENCH_MIN_INTERVAL = 0.0
+# 超出章节末页时返回的空阅读页（与站点一致：有正文容器但没有段落）
+EMPTY_PAGE = '<html><body><div class="panel panel-reading"><pre></pre></div></body></html>'
+
+
+class FixtureServer:
+    """
+    用 fixtures/wattpad 中保存的页面模拟 Wattpad 的本地 HTTP 服务器（在后台线程运行）
+    - /api/v3/stories/<故事 ID>  -> story/<故事 ID>.json（带 ETag，支持 If-None-Match 返回 304）
+    - /story/<故事 ID>-<标题>   -> story/<故事 ID>-<标题>.html
+    - /<章节 ID>-<标题>[/page/N] -> <章节 ID>-<标题>[_pageN].html，已有章节的超出页返回空阅读页
+    客户端声明支持 gzip 时压缩响应；api_enabled=False 时接口返回 404，用于检查回退到解析主页。
+    """
+
+    def __init__(self, fixture_dir=FIXTURE_DIR):
+        self.fixture_dir = fixture_dir
+        self.api_enabled = True
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fixture-server', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _read(self, *parts):
+        path = os.path.join(self.fixture_dir, *parts)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def resolve(self, path):
+        """返回 (状态码, 正文, Content-Type)"""
+        match = re.fullmatch(r'/api/v3/stories/(\d+)', path)
+        if match:
+            body = self._read('story', f'{match.group(1)}.json') if self.api_enabled else None
+            if body is None:
+                return 404, 'not found', 'text/plain'
+            return 200, body.replace(FIXTURE_ORIGIN, self.base_url), 'application/json'
+        match = re.fullmatch(r'/story/([^/]+)', path)
+        if match:
+            body = self._read('story', f'{match.group(1)}.html')
+            return (200, body, 'text/html') if body is not None else (404, 'not found', 'text/plain')
+        match = re.fullmatch(r'/(\d+-[^/]+?)(?:/page/(\d+))?', path)
+        if match:
+            slug, page = match.group(1), int(match.group(2) or 1)
+            if self._read(f'{slug}.html') is None:
+                return 404, 'not found', 'text/plain'
+            body = self._read(f'{slug}.html' if page == 1 else f'{slug}_page{page}.html')
+            return 200, body if body is not None else EMPTY_PAGE, 'text/html'
+        return 404, 'not found', 'text/plain'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                status, body, content_type = server.resolve(path)
+                data = body.encode('utf-8')
+                etag = f'"{hashlib.sha1(data).hexdigest()}"'
+                if status == 200 and content_type == 'application/json' and self.headers.get('If-None-Match') == etag:
+                    status, data = 304, b''
+                gzipped = bool(data) and 'gzip' in self.headers.get('Accept-Encoding', '')
+                if gzipped:
+                    data = gzip.compress(data)
+                with server._lock:
+                    server.requests.append((path, status, gzipped))
+                self.send_response(status)
+                if status != 304:
+                    self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                    self.send_header('Content-Length', str(len(data)))
+                    if gzipped:
+                        self.send_header('Content-Encoding', 'gzip')
+                if content_type == 'application/json':
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def expected_chapter(fixture_dir, chapter_url):
+    """按页码顺序直接解析样本文件，得到下载结果应有的章节文件内容"""
+    slug = chapter_url.rstrip('/').rsplit('/', 1)[-1]
+    title, contents = None, []
+    page, name = 1, f'{slug}.html'
+    while os.path.isfile(os.path.join(fixture_dir, name)):
+        with open(os.path.join(fixture_dir, name), 'r', encoding='utf-8') as f:
+            page_title, text = extract_chapter_page(f.read())
+        title = title or page_title
+        if text:
+            contents.append(text)
+        page += 1
+        name = f'{slug}_page{page}.html'
+    return f"{title}\n\n" + "\n\n".join(contents).strip()
+
+
+async def _check_toc(server, story_url):
+    """接口获取目录、带 ETag 再次获取（304）、接口不可用时解析主页，三种来源的章节列表应一致"""
+    failures = []
+    async with StorySession("", min_interval=BENCH_MIN_INTERVAL) as session:
+        toc, _ = await get_story_toc(session, story_url)
+        if toc is None or toc["source"] != "api":
+            return None, ["接口目录获取失败"]
+        cached, unchanged = await get_story_toc(session, story_url, toc)
+        if not unchanged or cached is not toc:
+            failures.append("带 ETag 的第二次请求没有得到 304")
+        server.api_enabled = False
+        try:
+            page_toc, _ = await get_story_toc(session, story_url)
+        finally:
+            server.api_enabled = True
+        if page_toc is None or page_toc["source"] != "page":
+            failures.append("接口不可用时没有回退到故事主页")
+        elif [c["url"] for c in page_toc["chapters"]] != [c["url"] for c in toc["chapters"]]:
+            failures.append("主页目录与接口目录不一致")
+    print(f"目录: {len(toc['chapters'])} 章")
+    return toc, failures
+
+
+async def _download_all(toc, output_dir):
+    """并发下载全部章节，返回耗时（秒）"""
+    status = StatusStore(output_dir)
+    start = time.perf_counter()
+    async with StorySession("", min_interval=BENCH_MIN_INTERVAL) as session:
+        results = await asyncio.gather(*(download_chapter_content(session, chapter["url"], index, output_dir, status)
+                                         for index, chapter in enumerate(toc["chapters"], 1)))
+    status.save()
+    return time.perf_counter() - start, results
+
+
+def run_benchmark(fixture_dir=FIXTURE_DIR):
+    """启动替身服务器，检查目录获取与章节下载结果，全部通过返回 True"""
+    story_files = [name for name in sorted(os.listdir(os.path.join(fixture_dir, 'story'))) if name.endswith('.html')]
+    if not story_files:
+        print(f"❌ 未找到故事主页样本: {os.path.join(fixture_dir, 'story')}")
+        return False
+    with FixtureServer(fixture_dir) as server, tempfile.TemporaryDirectory() as output_dir:
+        story_url = f"{server.base_url}/story/{story_files[0][:-len('.html')]}"
+        toc, failures = asyncio.run(_check_toc(server, story_url))
+        if toc is not None:
+            server.requests.clear()
+            elapsed, results = asyncio.run(_download_all(toc, output_dir))
+            for index, (chapter, ok) in enumerate(zip(toc["chapters"], results), 1):
+                content = None
+                if ok:
+                    with open(chapter_file_path(output_dir, index), 'r', encoding='utf-8') as f:
+                        content = f.read()
+                if content != expected_chapter(fixture_dir, chapter["url"]):
+                    failures.append(f"第 {index} 章内容与样本不一致: {chapter['url']}")
+            pages = len(server.requests)
+            gzipped = sum(1 for _, _, compressed in server.requests if compressed)
+            print(f"章节下载: {len(results)} 章，{pages} 次页面请求（{gzipped} 次 gzip），用时 {elapsed * 1000:.0f} ms")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 目录与章节内容均与样本一致")
+    return not failures
+
+
+if __name__ == "__main__":
+    # 用法: python bench_download.py [样本目录]，默认使用 fixtures/wattpad
+    sys.exit(0 if run_benchmark(sys.argv[1] if len(sys.argv) > 1 else FIXTURE_DIR) else 1)
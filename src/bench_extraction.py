@@ -0,0 +1,68 @@
+# bench_extraction.py (章节页正文提取的解析后端对比基准)
+import os
+import sys
+import glob
+import time
+import statistics
+
+from wattpad_extract import available_backends, extract_chapter_page
+
+# 作为对照的参考后端，其余后端的提取结果必须与它一致
+REFERENCE_BACKEND = 'html.parser'
+# 仓库自带的章节页样本（正文在 <pre>、data-testid="content" 和 panel-reading 三种版式中各有覆盖）
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'wattpad')
+
+
+def load_fixtures(fixture_dir):
+    """读取目录下保存的 Wattpad 章节页 HTML（*.html / *.htm）"""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, '*.htm*'))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            fixtures.append((os.path.basename(path), f.read()))
+    return fixtures
+
+
+def measure_backend(backend, fixtures, repeat=5):
+    """返回后端解析全部样本一遍耗时的中位数（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, html in fixtures:
+            extract_chapter_page(html, backend)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def check_consistency(backend, fixtures):
+    """返回提取结果与参考后端不一致的样本文件名"""
+    return [name for name, html in fixtures
+            if extract_chapter_page(html, backend) != extract_chapter_page(html, REFERENCE_BACKEND)]
+
+
+def run_benchmark(fixture_dir, repeat=5):
+    """逐个后端测量提取耗时并校验结果，全部一致返回 True"""
+    fixtures = load_fixtures(fixture_dir)
+    if not fixtures:
+        print(f"❌ 未找到 HTML 样本: {fixture_dir}")
+        return False
+    total_kb = sum(len(html) for _, html in fixtures) / 1024
+    print(f"样本: {len(fixtures)} 个页面，共 {total_kb:.0f} KB，每个后端重复 {repeat} 次")
+
+    passed = True
+    for backend in available_backends():
+        elapsed = measure_backend(backend, fixtures, repeat)
+        mismatched = check_consistency(backend, fixtures) if backend != REFERENCE_BACKEND else []
+        per_page = elapsed / len(fixtures) * 1000
+        status = "✅" if not mismatched else "❌"
+        print(f"{status} {backend}: {elapsed * 1000:.1f} ms（{per_page:.2f} ms/页）")
+        if mismatched:
+            passed = False
+            print(f"   与 {REFERENCE_BACKEND} 结果不一致: {', '.join(mismatched)}")
+    return passed
+
+
+if __name__ == "__main__":
+    # 用法: python bench_extraction.py [HTML 样本目录] [重复次数]，默认使用 fixtures/wattpad
+    fixture_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FIXTURE_DIR
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sys.exit(0 if run_benchmark(fixture_dir, repeat) else 1)
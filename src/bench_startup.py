@@ -0,0 +1,69 @@
+# bench_startup.py (CLI 启动耗时基准，防止重量级依赖回到模块导入阶段)
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+
+# 各入口模块导入后不应出现在 sys.modules 中的重量级依赖
+HEAVY_MODULES = ['torch', 'whisper', 'TTS', 'jiwer', 'jieba', 'pydub', 'numpy', 'ollama', 'paramiko', 'crawl4ai']
+
+# 需要检测的入口模块
+ENTRY_MODULES = ['wattpad_downloader', 'generate_and_deploy_rss', 'batch_audiobook_generator', 'audiobook_generator']
+
+# 单次导入耗时上限（秒）
+DEFAULT_BUDGET_SECONDS = 1.0
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure_import(module, repeat=5):
+    """在全新的解释器中重复导入模块，返回 (耗时中位数, 被提前导入的重量级依赖)"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=src_dir + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    timings = []
+    heavy = []
+    # 在临时目录运行，避免入口模块在导入时创建的目录污染当前工作目录
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(repeat):
+            result = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                    cwd=work_dir, env=env, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"导入 {module} 失败:\n{result.stderr.strip()}")
+            data = json.loads(result.stdout.strip().splitlines()[-1])
+            timings.append(data['elapsed'])
+            heavy = data['heavy']
+    return statistics.median(timings), heavy
+
+
+def run_benchmark(modules=None, budget=DEFAULT_BUDGET_SECONDS, repeat=5):
+    """逐个测量入口模块的导入耗时，全部达标返回 True"""
+    passed = True
+    for module in modules or ENTRY_MODULES:
+        try:
+            elapsed, heavy = measure_import(module, repeat)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            passed = False
+            continue
+        ok = elapsed <= budget and not heavy
+        passed = passed and ok
+        status = "✅" if ok else "❌"
+        print(f"{status} {module}: {elapsed * 1000:.0f} ms (上限 {budget * 1000:.0f} ms)")
+        if heavy:
+            print(f"   导入时提前加载了重量级依赖: {', '.join(heavy)}")
+    return passed
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_SECONDS
+    modules = sys.argv[2:] or None
+    sys.exit(0 if run_benchmark(modules, budget) else 1)
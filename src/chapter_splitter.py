@@ -0,0 +1,215 @@
+# chapter_splitter.py (流式章节分割，内存占用与输入文件大小无关)
+import os
+import re
+import json
+import codecs
+import filecmp
+import hashlib
+
+ENCODINGS_TO_TRY = ['utf-8', 'gbk', 'gb18030', 'latin1', 'cp1252']
+
+CHAPTER_PATTERN = re.compile(r'(?P<title>(?:Chapter\s+\d+|CHAPTER\s+[IVXLC]+|第[\s\S]{1,9}?章|序章|引子|尾声|后记))',
+                             flags=re.IGNORECASE)
+
+# 编码探测读取的前缀字节数
+SAMPLE_BYTES = 64 * 1024
+# 每次读取的字符数
+CHUNK_CHARS = 1024 * 1024
+# 缓冲区末尾保留的字符数：章节标题可能跨越两次读取，末尾这段要等下一块读入后再匹配
+TAIL_OVERLAP = 256
+
+# 与 toc.json 同目录的分割记录：输入文件的大小和哈希，未变化时跳过重新分割
+SPLIT_STATE_FILE = 'toc.source.json'
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def candidate_encodings(input_file, encodings=ENCODINGS_TO_TRY, sample_bytes=SAMPLE_BYTES):
+    """
+    用文件前缀筛选候选编码（保持原有优先顺序）
+    前缀都解码失败的编码整个文件也必然失败，直接排除；前缀通过的仍可能在后文失败，由调用方回退。
+    """
+    with open(input_file, 'rb') as f:
+        sample = f.read(sample_bytes)
+    candidates = []
+    for enc in encodings:
+        try:
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        candidates.append(enc)
+    return candidates
+
+
+def file_fingerprint(path):
+    """计算文件的大小和 SHA-256"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            sha.update(block)
+            size += len(block)
+    return {"size": size, "sha256": sha.hexdigest()}
+
+
+def replace_if_changed(tmp_path, path):
+    """用临时文件替换目标文件；内容相同时保留原文件（mtime 不变）并删除临时文件，返回是否替换"""
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def write_text_if_changed(path, text):
+    """内容有变化时才写入文本文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return replace_if_changed(tmp_path, path)
+
+
+def load_unchanged_toc(input_file, output_dir):
+    """
+    输入文件与上次分割时一致（大小、哈希相同）且章节文件齐全时返回上次的目录，否则返回 None
+    先比较大小，相同才计算哈希。
+    """
+    state_path = os.path.join(output_dir, SPLIT_STATE_FILE)
+    toc_path = os.path.join(output_dir, 'toc.json')
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        with open(toc_path, 'r', encoding='utf-8') as f:
+            toc = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("size") != os.path.getsize(input_file):
+        return None
+    if state.get("sha256") != file_fingerprint(input_file)["sha256"]:
+        return None
+    if not toc or not all(os.path.exists(entry["file"]) for entry in toc):
+        return None
+    return toc
+
+
+def save_split_state(input_file, output_dir, toc):
+    """写入 toc.json（内容不变时不改写）和分割记录"""
+    write_text_if_changed(os.path.join(output_dir, 'toc.json'), json.dumps(toc, ensure_ascii=False, indent=2))
+    state = {"input_file": os.path.abspath(input_file), **file_fingerprint(input_file)}
+    write_text_if_changed(os.path.join(output_dir, SPLIT_STATE_FILE), json.dumps(state, ensure_ascii=False, indent=2))
+
+
+class _ChapterWriter:
+    """
+    逐块写入章节文件，末尾空白暂存不写，关闭时丢弃（等价于整章 strip 后写入）
+    先写临时文件，关闭时与已有文件比较，内容相同则保留原文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self._pending = ''
+
+    def write(self, text):
+        text = self._pending + text
+        body = text.rstrip()
+        self._pending = text[len(body):]
+        if body:
+            self._file.write(body)
+
+    def close(self):
+        self._file.close()
+        replace_if_changed(self._tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def _split_stream(f, chapters_dir):
+    """扫描已打开的文本流，边读边写章节文件，返回目录列表 [{"chapter", "title", "file"}]"""
+    toc = []
+    writer = None
+    # 第一个标题之前的内容：有标题时丢弃，整个文件都没有标题时作为唯一一章
+    preamble_path = os.path.join(chapters_dir, '.preamble.tmp')
+    preamble = open(preamble_path, 'w', encoding='utf-8')
+    try:
+        buf = ''
+        pos = 0        # 下一次匹配的起点（buf 内下标）
+        write_pos = 0  # buf 中尚未写出的起点
+        eof = False
+        while not eof:
+            chunk = f.read(CHUNK_CHARS)
+            eof = not chunk
+            buf += chunk
+            safe_limit = len(buf) if eof else len(buf) - TAIL_OVERLAP
+
+            while True:
+                match = CHAPTER_PATTERN.search(buf, pos)
+                if match is None or not (eof or (match.start() < safe_limit and match.end() < len(buf))):
+                    break
+                text = buf[write_pos:match.start()]
+                if writer is None:
+                    preamble.write(text)
+                else:
+                    writer.write(text)
+                    writer.close()
+                chapter_num = len(toc) + 1
+                chapter_file = os.path.join(chapters_dir, f'chapter_{chapter_num:02d}.txt')
+                writer = _ChapterWriter(chapter_file)
+                toc.append({"chapter": chapter_num, "title": match.group('title').strip(), "file": chapter_file})
+                write_pos = match.start()
+                pos = match.end()
+
+            # 安全边界之前且不属于待定标题的文本可以写出并从缓冲区移除
+            flush_to = len(buf) if eof else safe_limit
+            if match is not None:
+                flush_to = min(flush_to, match.start())
+            if flush_to > write_pos:
+                text = buf[write_pos:flush_to]
+                (preamble if writer is None else writer).write(text)
+                write_pos = flush_to
+            pos = max(pos, write_pos) - write_pos
+            buf = buf[write_pos:]
+            write_pos = 0
+
+        if writer is not None:
+            writer.close()
+        preamble.close()
+        if toc:
+            os.remove(preamble_path)
+        else:
+            chapter_file = os.path.join(chapters_dir, 'chapter_01.txt')
+            replace_if_changed(preamble_path, chapter_file)
+            toc.append({"chapter": 1, "title": "全文", "file": chapter_file})
+        return toc
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        if not preamble.closed:
+            preamble.close()
+        if os.path.exists(preamble_path):
+            os.remove(preamble_path)
+        raise
+
+
+def split_chapters(input_file, chapters_dir):
+    """
+    流式分割章节文件
+    编码按 ENCODINGS_TO_TRY 的顺序选择第一个能解码整个文件的（与整体读取时一致），
+    读到后文才解码失败时换下一个编码重新分割。
+    返回 (目录列表, 实际使用的编码)；所有编码都失败时以 utf-8 替换错误字符读取，编码为 None。
+    """
+    os.makedirs(chapters_dir, exist_ok=True)
+    for enc in candidate_encodings(input_file):
+        try:
+            with open(input_file, 'r', encoding=enc) as f:
+                return _split_stream(f, chapters_dir), enc
+        except UnicodeDecodeError:
+            continue
+        except Exception as e:
+            print(f"使用编码 '{enc}' 读取文件时发生其他错误: {e}")
+            continue
+    with open(input_file, 'r', encoding='utf-8', errors='replace') as f:
+        return _split_stream(f, chapters_dir), None
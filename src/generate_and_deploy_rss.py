@@ -17,18 +17,12 @@ try:
 except ImportError as e:
     raise ImportError(f"请先安装所需库: pip install feedgen feedparser") from e
 
-# 尝试导入 ollama，如果失败则提示安装
-try:
-    from ollama import Client
-except ImportError:
-    raise ImportError("请先安装 ollama 库: pip install ollama")
+import stat  # 用于检查文件/目录属性
+from lazy_imports import lazy_import
 
-# --- 新增：尝试导入 paramiko，如果失败则提示安装 ---
-try:
-    import paramiko
-    import stat  # 用于检查文件/目录属性
-except ImportError:
-    raise ImportError("请先安装 paramiko 库: pip install paramiko")
+# ollama 与 paramiko 延迟到首次使用时才导入，缺失时再提示安装
+ollama = lazy_import('ollama', install_hint="请先安装 ollama 库: pip install ollama")
+paramiko = lazy_import('paramiko', install_hint="请先安装 paramiko 库: pip install paramiko")
 # --- 导入结束 ---
 
 # --- 在脚本顶部定义常量 ---
@@ -40,8 +34,18 @@ MP3_FILE_PATTERN = "chapter_*_final.mp3"
 TXT_FILE_PATTERN = "chapter_*.txt"
 # 章节内容子目录 (如果存在)
 CHAPTERS_SUBDIR = "chapters"
-ollama_clent = Client() # 注意：原文件此处拼写为 ollama_clent，保持一致
 # --- 常量定义结束 ---
+_ollama_client = None
+
+
+def get_ollama_client():
+    """获取 Ollama 客户端（首次调用时创建）"""
+    global _ollama_client
+    if _ollama_client is None:
+        _ollama_client = ollama.Client()
+    return _ollama_client
+
+
 def remove_special_chars(url):
     """Remove invalid characters from a URL path and return a clean path.""";
     """
@@ -195,44 +199,52 @@ def check_and_synthesize_missing_audio(input_directory, config_path='config.yaml
         # 遍历所有章节输出目录
         chapter_dirs = list(Path(input_directory).glob("Chapter_*_audiobook_output"))
 
-        for chapter_dir in chapter_dirs:
-            print(f"检查章节目录: {chapter_dir.name}")
+        # 所有需要重新合成的章节共享同一组已加载的模型
+        from model_registry import model_session
+        with model_session():
+            _synthesize_missing_audio(chapter_dirs, config_path)
 
-            # 检查最终MP3文件是否存在
-            txt_file = list(chapter_dir.parent.glob(f"{chapter_dir.name.replace('_audiobook_output', '')}.txt"))
-            if txt_file:
-                txt_filename = txt_file[0].stem
-                final_mp3 = chapter_dir / "chapters" / f"{txt_filename}_final.mp3"
+    except Exception as e:
+        print(f"检查和合成过程中出错: {e}")
 
-                if not final_mp3.exists():
-                    print(f"  -> 缺失最终MP3文件: {final_mp3}")
-
-                    # 检查日志文件
-                    log_file = chapter_dir / "logs" / "audiobook.log"
-                    if log_file.exists():
-                        # 检查日志中是否显示生成完成
-                        with open(log_file, 'r', encoding='utf-8') as f:
-                            log_content = f.read()
-
-                        if "✅ === 有声书生成完成" in log_content:
-                            print(f"  -> 日志显示已完成但缺少MP3文件，重新合成: {chapter_dir.name}")
-                            # 重新生成该章节
-                            try:
-                                from audiobook_generator import generate_audiobook
-                                generate_audiobook(str(chapter_dir.parent), str(txt_file[0]), config_path,
-                                                   force_rebuild=True)
-                                print(f"  -> 重新合成完成: {chapter_dir.name}")
-                            except Exception as e:
-                                print(f"  -> 重新合成失败: {e}")
-                        else:
-                            print(f"  -> 日志显示未完成生成: {chapter_dir.name}")
+
+def _synthesize_missing_audio(chapter_dirs, config_path):
+    """逐个检查章节目录，对日志显示已完成但缺少最终MP3的章节重新合成"""
+    for chapter_dir in chapter_dirs:
+        print(f"检查章节目录: {chapter_dir.name}")
+
+        # 检查最终MP3文件是否存在
+        txt_file = list(chapter_dir.parent.glob(f"{chapter_dir.name.replace('_audiobook_output', '')}.txt"))
+        if txt_file:
+            txt_filename = txt_file[0].stem
+            final_mp3 = chapter_dir / "chapters" / f"{txt_filename}_final.mp3"
+
+            if not final_mp3.exists():
+                print(f"  -> 缺失最终MP3文件: {final_mp3}")
+
+                # 检查日志文件
+                log_file = chapter_dir / "logs" / "audiobook.log"
+                if log_file.exists():
+                    # 检查日志中是否显示生成完成
+                    with open(log_file, 'r', encoding='utf-8') as f:
+                        log_content = f.read()
+
+                    if "✅ === 有声书生成完成" in log_content:
+                        print(f"  -> 日志显示已完成但缺少MP3文件，重新合成: {chapter_dir.name}")
+                        # 重新生成该章节
+                        try:
+                            from audiobook_generator import generate_audiobook
+                            generate_audiobook(str(chapter_dir.parent), str(txt_file[0]), config_path,
+                                               force_rebuild=True)
+                            print(f"  -> 重新合成完成: {chapter_dir.name}")
+                        except Exception as e:
+                            print(f"  -> 重新合成失败: {e}")
                     else:
-                        print(f"  -> 缺少日志文件: {log_file}")
+                        print(f"  -> 日志显示未完成生成: {chapter_dir.name}")
                 else:
-                    print(f"  -> 最终MP3文件已存在: {final_mp3}")
-
-    except Exception as e:
-        print(f"检查和合成过程中出错: {e}")
+                    print(f"  -> 缺少日志文件: {log_file}")
+            else:
+                print(f"  -> 最终MP3文件已存在: {final_mp3}")
 
 
 def verify_audio_files_integrity(input_directory):
@@ -487,7 +499,7 @@ The text content is as follows:
         print(f"  -> 调用 Ollama 模型 '{model_name}' 分析章节内容...")
         for attempt in range(retries + 1):
             try:
-                response = ollama_clent.chat(
+                response = get_ollama_client().chat(
                     model=model_name,
                     messages=messages,
                 )
@@ -0,0 +1,54 @@
+# lazy_imports.py (重量级依赖的延迟加载)
+import importlib
+import threading
+import types
+
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    模块代理：首次访问属性时才真正导入目标模块
+    用于 torch / whisper / TTS / pydub 等导入耗时数秒的依赖，
+    只下载或只更新 RSS 的运行不会为用不到的库付出启动时间。
+    """
+
+    def __init__(self, name, install_hint=None):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_hint'] = install_hint
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    try:
+                        module = importlib.import_module(self.__dict__['_lazy_name'])
+                    except ImportError as e:
+                        hint = self.__dict__['_lazy_hint']
+                        if hint:
+                            raise ImportError(hint) from e
+                        raise
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_lazy_name']}' ({state})>"
+
+
+def lazy_import(name, install_hint=None):
+    """返回延迟导入的模块代理；install_hint 为导入失败时的提示信息"""
+    return LazyModule(name, install_hint)
@@ -0,0 +1,85 @@
+# model_registry.py (进程内 TTS / Whisper 模型注册表)
+import os
+import threading
+from contextlib import contextmanager
+
+os.environ.setdefault("COQUI_TOS_AGREED", "1")
+
+XTTS_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+_lock = threading.RLock()
+_tts_models = {}
+_whisper_models = {}
+_tts_pools = {}
+_session_depth = 0
+
+
+def get_tts_models(count, device, model_name=XTTS_MODEL_NAME):
+    """
+    获取 count 个 TTS 模型实例，已加载的实例直接复用，不足时才加载新的
+    返回的实例在注册表生命周期内保持不变，调用方不应自行释放。
+    """
+    with _lock:
+        instances = _tts_models.setdefault((model_name, device), [])
+        while len(instances) < count:
+            from TTS.api import TTS
+            print(f"加载 TTS 模型 ({len(instances) + 1}/{count}): {model_name} -> {device}")
+            instances.append(TTS(model_name).to(device))
+        return instances[:count]
+
+
+def get_whisper_model(name):
+    """获取 Whisper 模型，同名模型只加载一次"""
+    with _lock:
+        if name not in _whisper_models:
+            import whisper
+            print(f"加载 Whisper 模型: {name}")
+            _whisper_models[name] = whisper.load_model(name)
+        return _whisper_models[name]
+
+
+def get_tts_worker_pool(key, factory):
+    """获取多进程 TTS 副本池，相同配置 key 的池在注册表生命周期内只创建一次"""
+    with _lock:
+        if key not in _tts_pools:
+            _tts_pools[key] = factory()
+        return _tts_pools[key]
+
+
+def release_models():
+    """释放所有已加载的模型（包括关闭多进程 TTS 副本池）"""
+    with _lock:
+        if not _tts_models and not _whisper_models and not _tts_pools:
+            return
+        for pool in _tts_pools.values():
+            pool.shutdown()
+        _tts_pools.clear()
+        _tts_models.clear()
+        _whisper_models.clear()
+        print("已释放所有 TTS / Whisper 模型")
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+@contextmanager
+def model_session():
+    """
+    模型生命周期作用域
+    在同一个会话内（可嵌套）多次生成有声书会复用已加载的模型，
+    最外层会话退出时统一释放。
+    """
+    global _session_depth
+    with _lock:
+        _session_depth += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _session_depth -= 1
+            outermost = _session_depth == 0
+        if outermost:
+            release_models()
@@ -0,0 +1,129 @@
+# segment_dedup.py (整本书重复短句的去重预合成)
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_cache import normalize_segment_text
+
+DEDUP_MAX_CHARS = 40
+DEDUP_MIN_COUNT = 2
+DEDUP_REPORT_FILE = 'dedup_report.json'
+# 报告中列出的出现次数最多的短句数
+REPORT_TOP_ENTRIES = 20
+
+
+def build_dedup_options(config):
+    """从配置中读取去重参数，未开启时返回 None"""
+    if not config.get('tts_dedup_enabled', False):
+        return None
+    return {
+        "max_chars": int(config.get('tts_dedup_max_chars', DEDUP_MAX_CHARS)),
+        "min_count": max(2, int(config.get('tts_dedup_min_count', DEDUP_MIN_COUNT))),
+    }
+
+
+def find_repeated_segments(annotations, get_valid_speaker, max_chars=DEDUP_MAX_CHARS, min_count=DEDUP_MIN_COUNT):
+    """
+    统计所有章节中重复出现的 (规范化文本, speaker) 短句
+    返回按出现次数降序排列的 OrderedDict {(文本, speaker): [(章节编号, 片段序号), ...]} 和片段总数
+    """
+    occurrences = {}
+    total = 0
+    for chapter_num, anno_list in annotations.items():
+        for i, anno in enumerate(anno_list):
+            text = normalize_segment_text(anno.get('text', ''))
+            if not text:
+                continue
+            total += 1
+            if len(text) > max_chars:
+                continue
+            speaker = get_valid_speaker(anno.get('speaker', 'Narrator'))
+            occurrences.setdefault((text, speaker), []).append((chapter_num, i))
+    repeated = [(pair, places) for pair, places in occurrences.items() if len(places) >= min_count]
+    repeated.sort(key=lambda item: len(item[1]), reverse=True)
+    return OrderedDict(repeated), total
+
+
+def _split_by_speaker(jobs, parts):
+    """按 speaker 整组分给各引擎（组内共享条件潜变量），每次分给当前字符数最少的一份"""
+    groups = OrderedDict()
+    for job in jobs:
+        groups.setdefault(job[2], []).append(job)
+    shares = [[] for _ in range(parts)]
+    loads = [0] * parts
+    for group in sorted(groups.values(), key=lambda g: sum(len(job[1]) for job in g), reverse=True):
+        target = loads.index(min(loads))
+        shares[target].extend(group)
+        loads[target] += sum(len(job[1]) for job in group)
+    return [share for share in shares if share]
+
+
+def precompute_repeated_segments(annotations, engines, get_valid_speaker, options, report_path=None):
+    """
+    把重复短句各合成一次写入片段音频缓存
+    之后各章节合成时，这些片段的每次出现都从缓存取得同一份音频，不再重复合成。
+    engines: 启用了 audio_cache 的 XttsSynthesisEngine 列表，每个引擎在独立线程中合成一部分短句。
+    返回去重报告（同时写入 report_path）。
+    """
+    repeated, total = find_repeated_segments(annotations, get_valid_speaker, options["max_chars"],
+                                             options["min_count"])
+    jobs, cached = [], []
+    engine = engines[0]
+    for text, speaker in repeated:
+        if engine.cache_key(text, speaker) in engine.audio_cache:
+            cached.append((text, speaker))
+        else:
+            jobs.append(((text, speaker), text, speaker))
+
+    print(f"🔁 重复短句: {len(repeated)} 种，共出现 "
+          f"{sum(len(places) for places in repeated.values())} 次；需合成 {len(jobs)} 种，已缓存 {len(cached)} 种")
+
+    def _run(engine, share):
+        start = time.perf_counter()
+        results = engine.synthesize_batch(share)
+        return results, time.perf_counter() - start
+
+    failed = set()
+    synthesis_seconds = 0.0
+    synthesized_chars = 0
+    shares = _split_by_speaker(jobs, len(engines))
+    if shares:
+        with ThreadPoolExecutor(max_workers=len(shares), thread_name_prefix='tts-dedup') as pool:
+            for results, elapsed in pool.map(lambda args: _run(*args), zip(engines, shares)):
+                synthesis_seconds += elapsed
+                for pair, (_, error) in results.items():
+                    if error is not None:
+                        print(f"⚠️ 重复短句合成失败 {pair[0]!r} ({pair[1]}): {error}")
+                        failed.add(pair)
+                    else:
+                        synthesized_chars += len(pair[0])
+
+    # 节省时间按本次合成的平均每字符耗时估算：本次合成的短句省下 (出现次数 - 1) 次，
+    # 缓存中已有的短句省下全部出现次数
+    seconds_per_char = synthesis_seconds / synthesized_chars if synthesized_chars else 0.0
+    saved_chars = 0
+    for pair, places in repeated.items():
+        if pair in failed:
+            continue
+        saved_chars += len(pair[0]) * (len(places) if pair in cached else len(places) - 1)
+
+    report = {
+        "segments": total,
+        "repeated_pairs": len(repeated),
+        "repeated_occurrences": sum(len(places) for places in repeated.values()),
+        "synthesized_pairs": len(jobs) - len(failed),
+        "cached_pairs": len(cached),
+        "failed_pairs": len(failed),
+        "synthesis_seconds": round(synthesis_seconds, 2),
+        "estimated_saved_seconds": round(saved_chars * seconds_per_char, 2),
+        "options": options,
+        "top": [{"text": text, "speaker": speaker, "count": len(places)}
+                for (text, speaker), places in list(repeated.items())[:REPORT_TOP_ENTRIES]],
+    }
+    print(f"✅ 重复短句预合成完成，用时 {report['synthesis_seconds']:.1f}s，"
+          f"估计节省合成时间 {report['estimated_saved_seconds']:.1f}s")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
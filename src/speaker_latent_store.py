@@ -0,0 +1,94 @@
+# speaker_latent_store.py (XTTS speaker 条件潜变量存储)
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from lazy_imports import lazy_import
+
+torch = lazy_import('torch')
+
+
+class SpeakerLatentStore:
+    """
+    speaker 条件潜变量 (gpt_cond_latent, speaker_embedding) 的两级存储
+    1. 进程内 LRU，供同一进程内的所有合成引擎共享；
+    2. 磁盘目录，每个 speaker 一个 .pt 文件，原子写入，可被多个进程/多本书共享。
+    若 voice_dir 中存在 <speaker>.wav，则以该参考音频克隆声音，否则使用模型内置 speaker。
+    """
+
+    def __init__(self, store_dir, model_name="xtts_v2", max_memory_entries=64, voice_dir=None):
+        self.store_dir = os.path.join(store_dir, re.sub(r'[^\w.-]', '_', model_name))
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.voice_dir = voice_dir
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _latent_path(self, speaker):
+        digest = hashlib.sha1(speaker.encode('utf-8')).hexdigest()[:16]
+        safe_name = re.sub(r'[\\/:*?"<>|\s]', '_', speaker)
+        return os.path.join(self.store_dir, f'{safe_name}_{digest}.pt')
+
+    def _voice_file(self, speaker):
+        if not self.voice_dir:
+            return None
+        voice_file = os.path.join(self.voice_dir, f'{speaker}.wav')
+        return voice_file if os.path.exists(voice_file) else None
+
+    def _remember(self, speaker, latents):
+        with self._lock:
+            self._memory[speaker] = latents
+            self._memory.move_to_end(speaker)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _compute(self, speaker, model):
+        voice_file = self._voice_file(speaker)
+        if voice_file:
+            print(f"🎙️ 根据参考音频计算 speaker 潜变量: {voice_file}")
+            return model.get_conditioning_latents(audio_path=[voice_file])
+        speaker_data = model.speaker_manager.speakers[speaker]
+        return speaker_data["gpt_cond_latent"], speaker_data["speaker_embedding"]
+
+    def _save(self, path, latents):
+        # 先写临时文件再重命名，其他进程不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            torch.save({"gpt_cond_latent": latents[0].cpu(), "speaker_embedding": latents[1].cpu()}, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, speaker, model):
+        """获取 speaker 的条件潜变量，依次查找内存、磁盘，最后才计算"""
+        with self._lock:
+            latents = self._memory.get(speaker)
+            if latents is not None:
+                self._memory.move_to_end(speaker)
+                return latents
+
+        device = model.device
+        path = self._latent_path(speaker)
+        latents = None
+        if os.path.exists(path):
+            try:
+                data = torch.load(path, map_location=device)
+                latents = (data["gpt_cond_latent"], data["speaker_embedding"])
+            except Exception as e:
+                print(f"⚠️ 读取 speaker 潜变量失败 {path}: {e}，重新计算")
+        if latents is None:
+            latents = self._compute(speaker, model)
+            try:
+                self._save(path, latents)
+            except Exception as e:
+                print(f"⚠️ 保存 speaker 潜变量失败 {path}: {e}")
+            latents = (latents[0].to(device), latents[1].to(device))
+
+        self._remember(speaker, latents)
+        return latents
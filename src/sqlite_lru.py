@@ -0,0 +1,79 @@
+# sqlite_lru.py (基于 SQLite 的持久化 LRU 缓存索引)
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+def content_key(*parts):
+    """按顺序对各字段计算 SHA-256 缓存键"""
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = part.encode('utf-8')
+        # 写入长度前缀，避免不同字段拼接后产生相同的串
+        digest.update(len(encoded).to_bytes(8, 'big'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class SqliteLruCache:
+    """
+    持久化缓存的公共部分：SQLite 表中每行记录 key、size、last_access（以及子类的取值列），
+    可被多个进程共享；超过条目数或总字节数上限时按最近访问时间淘汰。
+    子类负责读写取值，淘汰时通过 _on_evicted 清理表外的数据（如音频文件）。
+    """
+
+    def __init__(self, db_path, table, index_name, max_entries, max_bytes, value_columns=''):
+        self.db_path = db_path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            f"{value_columns}"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}(last_access)")
+        self._conn.commit()
+
+    def _touch(self, key):
+        """更新访问时间（调用方持有锁）"""
+        self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+
+    def _evict(self):
+        """执行淘汰（调用方持有锁，由调用方提交）"""
+        count, total_size = self._conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+        # 从最久未访问的条目开始删除，直到同时满足条目数和字节数上限
+        evict_keys = []
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access ASC"):
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                break
+            evict_keys.append(key)
+            count -= 1
+            total_size -= size
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in evict_keys])
+        self._on_evicted(evict_keys)
+
+    def _on_evicted(self, keys):
+        pass
+
+    def stats(self):
+        """返回命中/未命中次数与当前缓存规模"""
+        with self._lock:
+            count, total_size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total_size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
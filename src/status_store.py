@@ -0,0 +1,153 @@
+# status_store.py (故事下载状态 .status.json 的批量、原子持久化)
+import os
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+STATUS_FILE = ".status.json"
+
+# 累计多少次修改或距上次写入多少秒后落盘
+STATUS_FLUSH_EVERY = 20
+STATUS_FLUSH_INTERVAL = 5.0
+
+DEFAULT_STATUS = {
+    "failed_chapters": [],
+    "total_chapters": 0,
+    "completed": False,
+    "audiobook_generated": False,
+    "rss_updated": False,
+    "last_updated": None
+}
+
+
+def format_ranges(indices):
+    """将章节序号集合压缩为区间字符串，例如 {1, 2, 3, 7} -> 1-3,7"""
+    ranges = []
+    for index in sorted(indices):
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def parse_ranges(text):
+    """区间字符串还原为章节序号集合"""
+    indices = set()
+    for part in filter(None, (item.strip() for item in text.split(','))):
+        start, _, end = part.partition('-')
+        indices.update(range(int(start), int(end or start) + 1))
+    return indices
+
+
+class StatusStore:
+    """
+    单个故事的下载状态
+    已完成章节保存在内存集合中，文件里以区间字符串 completed_ranges（如 "1-120,125"）存储；
+    修改先累积在内存，达到 flush_every 次或超过 flush_interval 秒才写入，
+    写入时先写临时文件再重命名，中途崩溃不会留下半个 .status.json。
+    兼容旧格式的 completed_chapters 列表。
+    """
+
+    def __init__(self, output_dir, flush_every=STATUS_FLUSH_EVERY, flush_interval=STATUS_FLUSH_INTERVAL):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, STATUS_FILE)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._data, self._completed = self._load()
+
+    def _load(self):
+        data = dict(DEFAULT_STATUS)
+        completed = set()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                completed = parse_ranges(saved.pop("completed_ranges", ""))
+                completed.update(int(i) for i in saved.pop("completed_chapters", []))
+                data.update(saved)
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                print(f"读取下载状态失败，将重新开始: {self.path} ({e})")
+        return data, completed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.save()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._touch()
+
+    @property
+    def completed_count(self):
+        with self._lock:
+            return len(self._completed)
+
+    @property
+    def completed_chapters(self):
+        """已完成章节序号（升序列表）"""
+        with self._lock:
+            return sorted(self._completed)
+
+    def is_completed(self, index):
+        with self._lock:
+            return index in self._completed
+
+    def mark_completed(self, index):
+        """标记章节已完成，按批量策略写入"""
+        with self._lock:
+            if index in self._completed:
+                return
+            self._completed.add(index)
+            self._touch()
+
+    def discard_completed(self, indices):
+        """取消章节的完成标记（章节需要重新下载时使用）"""
+        with self._lock:
+            before = len(self._completed)
+            self._completed.difference_update(indices)
+            if len(self._completed) != before:
+                self._touch()
+
+    def _touch(self):
+        self._pending += 1
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.save()
+
+    def save(self):
+        """立即写入状态文件（没有未保存的修改时跳过）"""
+        with self._lock:
+            if self._pending == 0 and os.path.exists(self.path):
+                return
+            self._data["last_updated"] = datetime.now().isoformat()
+            snapshot = {**self._data, "completed_ranges": format_ranges(self._completed)}
+            os.makedirs(self.output_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix=STATUS_FILE, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._pending = 0
+            self._last_flush = time.monotonic()
@@ -0,0 +1,152 @@
+# tts_engine.py (XTTS 分组批量合成引擎)
+import io
+import wave
+from collections import OrderedDict
+
+from lazy_imports import lazy_import
+from audio_cache import SegmentAudioCache, normalize_segment_text
+from model_registry import XTTS_MODEL_NAME
+
+np = lazy_import('numpy')
+torch = lazy_import('torch')
+
+# 与 TTS Synthesizer 保持一致：每个句子后追加的静音采样数
+SENTENCE_GAP_SAMPLES = 10000
+
+
+def wav_to_bytes(wav, sample_rate):
+    """将浮点波形按峰值归一化后编码为 16-bit PCM WAV 字节（与 tts_to_file 的输出一致）"""
+    wav = np.asarray(wav, dtype=np.float32)
+    peak = max(0.01, float(np.max(np.abs(wav)))) if wav.size else 0.01
+    pcm = (wav * (32767 / peak)).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+class XttsSynthesisEngine:
+    """
+    XTTS 合成引擎
+    按 speaker 分组合成片段，每个 speaker 的条件潜变量 (gpt_cond_latent, speaker_embedding)
+    只计算一次并在组内复用；音频保存在内存缓冲区中，不经过临时文件。
+    提供 latent_store 时潜变量从共享的 SpeakerLatentStore 获取；
+    提供 audio_cache 时按 (文本, speaker, 语言, 模型版本) 复用已合成的片段音频。
+    """
+
+    def __init__(self, tts, language="en", latent_store=None, audio_cache=None):
+        self.tts = tts
+        self.model = tts.synthesizer.tts_model
+        self.language = language
+        self.sample_rate = self.model.config.audio.output_sample_rate
+        self.latent_store = latent_store
+        self.audio_cache = audio_cache
+        self._latents = {}
+        self.model_version = self._model_version()
+
+    @property
+    def available_speakers(self):
+        return list(self.model.speaker_manager.speakers.keys())
+
+    def get_conditioning_latents(self, speaker):
+        """获取 speaker 的条件潜变量"""
+        if self.latent_store is not None:
+            return self.latent_store.get(speaker, self.model)
+        if speaker not in self._latents:
+            speaker_data = self.model.speaker_manager.speakers[speaker]
+            self._latents[speaker] = (speaker_data["gpt_cond_latent"], speaker_data["speaker_embedding"])
+        return self._latents[speaker]
+
+    def _inference_settings(self):
+        config = self.model.config
+        return {
+            "temperature": config.temperature,
+            "length_penalty": config.length_penalty,
+            "repetition_penalty": config.repetition_penalty,
+            "top_k": config.top_k,
+            "top_p": config.top_p,
+        }
+
+    def _model_version(self):
+        """模型名、采样率与推理参数共同决定合成结果，任何一项变化都使缓存失效"""
+        model_name = getattr(self.tts, 'model_name', None) or XTTS_MODEL_NAME
+        settings = ','.join(f'{name}={value}' for name, value in sorted(self._inference_settings().items()))
+        return f'{model_name}|{self.sample_rate}|{settings}'
+
+    def cache_key(self, text, speaker):
+        return SegmentAudioCache.make_key(text, speaker, self.language, self.model_version)
+
+    def invalidate(self, text, speaker):
+        """从片段音频缓存中移除该片段（校验未通过时调用）"""
+        if self.audio_cache is not None:
+            self.audio_cache.discard(self.cache_key(text, speaker))
+
+    def synthesize(self, text, speaker):
+        """合成单段文本，返回 float32 波形"""
+        gpt_cond_latent, speaker_embedding = self.get_conditioning_latents(speaker)
+        settings = self._inference_settings()
+        wavs = []
+        for sentence in self.tts.synthesizer.split_into_sentences(text):
+            output = self.model.inference(sentence, self.language, gpt_cond_latent, speaker_embedding, **settings)
+            wav = output["wav"]
+            if torch.is_tensor(wav):
+                wav = wav.cpu().numpy()
+            wavs.append(np.asarray(wav, dtype=np.float32).reshape(-1))
+            wavs.append(np.zeros(SENTENCE_GAP_SAMPLES, dtype=np.float32))
+        if not wavs:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(wavs)
+
+    def synthesize_batch(self, jobs, refresh=False):
+        """
+        批量合成
+        jobs: [(key, text, speaker), ...]
+        返回 OrderedDict {key: (wav 字节, 错误)}，顺序与 jobs 一致
+        启用音频缓存时先查缓存（refresh=True 时跳过），只有未命中的片段才送入模型，合成结果写回缓存；
+        同一批中规范化文本和 speaker 都相同的片段只合成一次。
+        """
+        results = {}
+        # {speaker: {规范化文本: [key, ...]}}
+        groups = OrderedDict()
+        for key, text, speaker in jobs:
+            if self.audio_cache is not None and not refresh:
+                audio_bytes = self.audio_cache.get(self.cache_key(text, speaker))
+                if audio_bytes is not None:
+                    results[key] = (audio_bytes, None)
+                    continue
+            groups.setdefault(speaker, OrderedDict()).setdefault(normalize_segment_text(text), []).append(key)
+
+        if groups:
+            with torch.inference_mode():
+                for speaker, texts in groups.items():
+                    for text, keys in texts.items():
+                        try:
+                            wav = self.synthesize(text, speaker)
+                            result = (wav_to_bytes(wav, self.sample_rate), None)
+                        except Exception as e:
+                            result = (None, e)
+                        for key in keys:
+                            results[key] = result
+                        if self.audio_cache is not None and result[1] is None:
+                            try:
+                                self.audio_cache.put(self.cache_key(text, speaker), result[0])
+                            except Exception as e:
+                                print(f"⚠️ 写入片段音频缓存失败: {e}")
+        return OrderedDict((key, results[key]) for key, _, _ in jobs)
+
+    def synthesize_to_files(self, jobs, refresh=False):
+        """
+        合成并写入 WAV 文件
+        jobs: [(output_file, text, speaker), ...]
+        返回 {output_file: 错误或 None}
+        """
+        errors = {}
+        for output_file, (audio_bytes, error) in self.synthesize_batch(jobs, refresh).items():
+            if error is None:
+                with open(output_file, 'wb') as f:
+                    f.write(audio_bytes)
+            errors[output_file] = error
+        return errors
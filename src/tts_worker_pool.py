@@ -0,0 +1,260 @@
+# tts_worker_pool.py (多进程 TTS 副本池：按 GPU 显存或 CPU 物理核数分片合成)
+import os
+import shutil
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from lazy_imports import lazy_import
+from audio_cache import SegmentAudioCache, normalize_segment_text
+from model_registry import get_tts_models
+from speaker_latent_store import SpeakerLatentStore
+from tts_engine import XttsSynthesisEngine
+
+torch = lazy_import('torch')
+
+# 每个 CPU 副本默认使用的线程数：XTTS 自回归解码超过几个线程后收益很小，多开进程更划算
+TTS_THREADS_PER_PROCESS = 4
+# 单个 XTTS 副本大致占用的显存/内存（MB）
+TTS_REPLICA_MEMORY_MB = 3072
+# cuda:0 上为主进程额外预留的显存（MB）：规划前 Whisper 已加载，其权重已反映在空闲显存中，
+# 这里只预留 Whisper 推理时的激活和 CUDA 上下文增长
+GPU_RESERVE_MB = 2048
+# 工作进程导入 torch 之前设置的线程数环境变量
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+_MB = 1024 * 1024
+
+
+def physical_cpu_cores():
+    """物理核数（不计超线程），受进程 CPU 亲和性限制；无法识别时退回逻辑核数"""
+    logical = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    cores = set()
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8') as f:
+            physical_id = core_id = None
+            for line in f:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'physical id':
+                    physical_id = value.strip()
+                elif key == 'core id':
+                    core_id = value.strip()
+                elif not key and core_id is not None:
+                    cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+            if core_id is not None:
+                cores.add((physical_id, core_id))
+    except OSError:
+        pass
+    return max(1, min(len(cores), logical) if cores else logical)
+
+
+def available_memory_mb():
+    """可用内存（MB），无法读取时返回 None"""
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def plan_tts_workers(processes='auto', threads_per_process=TTS_THREADS_PER_PROCESS,
+                     replica_memory_mb=TTS_REPLICA_MEMORY_MB):
+    """
+    规划工作进程，返回 [(device, 线程数), ...]，每项对应一个模型副本
+    - GPU：processes 为 auto 时按各卡空闲显存能容纳的副本数分配（cuda:0 预留主进程所需；
+      应在主进程加载完 Whisper 等模型之后调用），
+      指定数量时在各卡间轮流分配；
+    - CPU：auto 时按物理核数 / 每进程线程数，并受可用内存限制；
+    CPU 线程按物理核数平均分给各进程，避免多个进程争抢同一批核。
+    """
+    cores = physical_cpu_cores()
+    if torch.cuda.is_available():
+        device_count = torch.cuda.device_count()
+        if processes == 'auto':
+            devices = []
+            for index in range(device_count):
+                free_mb = torch.cuda.mem_get_info(index)[0] // _MB - (GPU_RESERVE_MB if index == 0 else 0)
+                devices.extend([f'cuda:{index}'] * max(0, free_mb // replica_memory_mb))
+            devices = devices or ['cuda:0']
+        else:
+            devices = [f'cuda:{index % device_count}' for index in range(processes)]
+    else:
+        if processes == 'auto':
+            count = max(1, cores // max(1, threads_per_process))
+            memory_mb = available_memory_mb()
+            if memory_mb is not None:
+                count = max(1, min(count, memory_mb // replica_memory_mb))
+        else:
+            count = processes
+        devices = ['cpu'] * count
+    threads = max(1, cores // len(devices))
+    return [(device, threads) for device in devices]
+
+
+# ---- 工作进程 ----
+
+_worker_engine = None
+
+
+def _init_worker(slots, options):
+    """工作进程初始化：领取一个 (device, 线程数)，限制线程后加载模型副本"""
+    global _worker_engine
+    device, threads = slots.get()
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    torch.set_num_threads(threads)
+    tts = get_tts_models(1, device)[0]
+    latent_store = SpeakerLatentStore(options["latent_dir"], voice_dir=options.get("voice_dir"))
+    audio_cache = None
+    if options.get("cache_dir"):
+        audio_cache = SegmentAudioCache(options["cache_dir"], options["cache_max_entries"],
+                                        options["cache_max_bytes"])
+    _worker_engine = XttsSynthesisEngine(tts, latent_store=latent_store, audio_cache=audio_cache)
+    print(f"TTS 工作进程 {os.getpid()} 就绪: {device}，{threads} 线程")
+
+
+def _worker_info():
+    return _worker_engine.available_speakers, _worker_engine.model_version, _worker_engine.language
+
+
+def _format_error(error):
+    # 异常对象不一定能跨进程序列化，只传回描述
+    return None if error is None else f"{type(error).__name__}: {error}"
+
+
+def _cache_counts():
+    cache = _worker_engine.audio_cache
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+
+def _synthesize_to_file(output_file, text, speaker, refresh):
+    """返回 (错误描述, 本次缓存命中数, 本次缓存未命中数)"""
+    hits, misses = _cache_counts()
+    error = _worker_engine.synthesize_to_files([(output_file, text, speaker)], refresh)[output_file]
+    after = _cache_counts()
+    return _format_error(error), after[0] - hits, after[1] - misses
+
+
+def _synthesize_bytes(text, speaker, refresh):
+    """返回 (wav 字节, 错误描述, 本次缓存命中数, 本次缓存未命中数)"""
+    hits, misses = _cache_counts()
+    audio_bytes, error = _worker_engine.synthesize_batch([(0, text, speaker)], refresh)[0]
+    after = _cache_counts()
+    return audio_bytes, _format_error(error), after[0] - hits, after[1] - misses
+
+
+# ---- 主进程 ----
+
+class TtsWorkerPool:
+    """
+    多进程 XTTS 副本池，对外提供与 XttsSynthesisEngine 相同的 synthesize_to_files / synthesize_batch 接口
+    每个工作进程加载一个模型副本；一次调用中的片段先按 (规范化文本, speaker) 去重，
+    再按文本长度从长到短提交，最长的片段最先开始，减少整批等待最后一个长片段的尾部时间。
+    模型只在工作进程中，主进程不持有实例（tts 为 None）；片段缓存的命中统计由工作进程随结果传回。
+    """
+
+    tts = None
+
+    def __init__(self, slots, options):
+        context = multiprocessing.get_context('spawn')
+        slot_queue = context.Queue()
+        for slot in slots:
+            slot_queue.put(slot)
+        self.slots = slots
+        self._executor = ProcessPoolExecutor(max_workers=len(slots), mp_context=context,
+                                             initializer=_init_worker, initargs=(slot_queue, options))
+        self._stats_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        try:
+            # 每个进程一个任务，让所有副本在规划后立即加载，而不是等到合成时才按需启动
+            infos = [future.result() for future in
+                     [self._executor.submit(_worker_info) for _ in slots]]
+            self.available_speakers, self.model_version, self.language = infos[0]
+        except Exception:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self.audio_cache = None
+        if options.get("cache_dir"):
+            self.audio_cache = SegmentAudioCache(options["cache_dir"], options["cache_max_entries"],
+                                                 options["cache_max_bytes"])
+
+    def cache_key(self, text, speaker):
+        return SegmentAudioCache.make_key(text, speaker, self.language, self.model_version)
+
+    def invalidate(self, text, speaker):
+        """从片段音频缓存中移除该片段（缓存目录与工作进程共享）"""
+        if self.audio_cache is not None:
+            self.audio_cache.discard(self.cache_key(text, speaker))
+
+    @staticmethod
+    def _longest_first(jobs):
+        """按 (规范化文本, speaker) 合并重复片段，返回按文本长度降序排列的 [((文本, speaker), [key, ...]), ...]"""
+        unique = OrderedDict()
+        for key, text, speaker in jobs:
+            unique.setdefault((normalize_segment_text(text), speaker), []).append(key)
+        return sorted(unique.items(), key=lambda item: len(item[0][0]), reverse=True)
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def cache_counts(self):
+        """累计的片段缓存 (命中数, 未命中数)"""
+        with self._stats_lock:
+            return self.cache_hits, self.cache_misses
+
+    def synthesize_to_files(self, jobs, refresh=False):
+        """
+        合成并写入 WAV 文件
+        jobs: [(output_file, text, speaker), ...]
+        返回 {output_file: 错误或 None}
+        """
+        futures = [(self._executor.submit(_synthesize_to_file, files[0], text, speaker, refresh), files)
+                   for (text, speaker), files in self._longest_first(jobs)]
+        errors = {}
+        for future, files in futures:
+            try:
+                message, hits, misses = future.result()
+                self._count(hits, misses)
+                error = None if message is None else RuntimeError(message)
+            except Exception as e:
+                error = e
+            if error is None:
+                for duplicate in files[1:]:
+                    shutil.copyfile(files[0], duplicate)
+            for output_file in files:
+                errors[output_file] = error
+        return {output_file: errors[output_file] for output_file, _, _ in jobs}
+
+    def synthesize_batch(self, jobs, refresh=False):
+        """
+        批量合成
+        jobs: [(key, text, speaker), ...]
+        返回 OrderedDict {key: (wav 字节, 错误)}，顺序与 jobs 一致
+        """
+        futures = [(self._executor.submit(_synthesize_bytes, text, speaker, refresh), keys)
+                   for (text, speaker), keys in self._longest_first(jobs)]
+        results = {}
+        for future, keys in futures:
+            try:
+                audio_bytes, message, hits, misses = future.result()
+                self._count(hits, misses)
+                result = (audio_bytes, None if message is None else RuntimeError(message))
+            except Exception as e:
+                result = (None, e)
+            for key in keys:
+                results[key] = result
+        return OrderedDict((key, results[key]) for key, _, _ in jobs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self.audio_cache is not None:
+            self.audio_cache.close()
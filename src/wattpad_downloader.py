@@ -3,12 +3,18 @@ import asyncio
 import os
 import glob
 import json
-from datetime import datetime
-from crawl4ai import AsyncWebCrawler
-from crawl4ai.extraction_strategy import NoExtractionStrategy
 from bs4 import BeautifulSoup
 import time
 import re
+from urllib.parse import urljoin, urlparse
+from lazy_imports import lazy_import
+from wattpad_extract import extract_chapter_page, extract_page_text
+from status_store import StatusStore
+
+# crawl4ai 会拉起整套浏览器依赖，延迟到真正抓取时才导入
+crawl4ai = lazy_import('crawl4ai')
+crawl4ai_extraction = lazy_import('crawl4ai.extraction_strategy')
+aiohttp = lazy_import('aiohttp')
 
 # --- 配置 ---
 YOUR_WATTPAD_COOKIES = "wp_id=d3622c8c-f8bf-4725-9b3b-58c6a9bb6040; locale=en_US; lang=1; _gcl_au=1.1.229635524.1753744777; _fbp=fb.1.1753744777766.777872414890237537; _gid=GA1.2.120974872.1753744778; _col_uuid=298a2882-0726-406d-ac2a-637369060a41-3t3k; fs__exp=1; ff=1; dpr=1; tz=-8; X-Time-Zone=Asia%2FShanghai; token=523540601%3A2%3A1753747628%3Aocwa-PRhjN9qSUuepUlBUwz7hhPnL78ZtAHXLdx3q59U3JMl5Qde68qX1-H0WwJQ; te_session_id=1753796025284; isStaff=1; AMP_TOKEN=%24NOT_FOUND; signupFrom=story_reading; TRINITY_USER_ID=702f883b-89be-4578-8c95-d939ccc884f5; TRINITY_USER_DATA=eyJ1c2VySWRUUyI6MTc1Mzc5NjExODM0OCwiZmlyc3RDbGlja1RTIjoxNzUzNzk2MTM0OTcwfQ==; _pubcid=b5931962-36d4-4a22-85ec-aef93fdc80c7; _pubcid_cst=VyxHLMwsHQ%3D%3D; __qca=I0-428836967-1753796333975; cto_bundle=HNW7j18wRUc4SmlKM1d5bENGQmp5RTUlMkZZazlFbTNUSjU4UmNXNTRNakF6ZW1BeW1pUWJVZEo0Nk5iVlFubGVkOTR0TVNlbXAlMkZmYzNlT3BTUjZDSyUyQmVWUk54d00xTEslMkJia1Z6WUZtdEptUzFrVEhyam9yZGJFdEFxcWtYejdZOEUwdU9H; cto_bidid=0NEFNV9DVkF5bzFxeUFsak44eVhTNU1uSGpQWk9qTUR5aTdYYWhxcjhyciUyQmVWUk54d00xTEslMkJia1Z6WUZtdEptUzFrVEhyam9yZGJFdEFxcWtYejdZOEUwdU9H; _ga=GA1.1.408120238.1753744776; _ga_FNDTZ0MZDQ=GS2.1.s1753796037$o4$g1$t1753797711$j22$l0$h0; _dd_s=logs=1&id=8b383015-fee2-4d25-8b5a-b8b5c3034a5f&created=1753796025287&expire=1753798728025; RT=nu=https%3A%2F%2Fwww.wattpad.com%2F1420810072-the-escaped-con%2527s-hostage-three-buckle-up&cl=1753797726766&r=https%3A%2F%2Fwww.wattpad.com%2F1420515771-the-escaped-con%2527s-hostage-two-don%2527t-scream&ul=1753797835435"  # 替换为你的真实 Cookie
@@ -16,7 +22,9 @@ YOUR_WATTPAD_COOKIES = "wp_id=d3622c8c-f8bf-4725-9b3b-58c6a9bb6040; locale=en_US
 STORIES_TO_DOWNLOAD = [
     {
         "url": "https://www.wattpad.com/story/50979962-moonrise",
-        "title": "Moonrise"
+        "title": "Moonrise",
+        # 可选：抓取方式 "http"（纯 HTTP，缺内容时回退浏览器）或 "browser"，默认 DEFAULT_FETCH_MODE
+        "fetch_mode": "http"
     },
     {
         "url": "http://wattpad.com/story/258988576-see-me",
@@ -40,161 +48,412 @@ STORIES_TO_DOWNLOAD = [
 ]
 
 OUTPUT_DIR = "./downloaded_stories"
+CONFIG_PATH = "config.yaml"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# --- 状态管理 ---
-STATUS_FILE = ".status.json"
+# --- 抓取会话 ---
+# 同时进行的页面请求数上限
+MAX_CONCURRENT_FETCHES = 4
+# 同一故事同时下载的章节数上限
+MAX_CONCURRENT_CHAPTERS = 3
+# 同时下载的故事数上限（各故事共享按主机限速）
+MAX_CONCURRENT_STORIES = 3
+# 同一主机相邻两次请求的最小间隔（秒），替代原先固定的 sleep
+HOST_MIN_INTERVAL = 0.5
+# 默认抓取方式：
+#   "http"    - 纯 HTTP 请求（keep-alive 连接池 + gzip），静态 HTML 缺少内容时才回退到浏览器渲染
+#   "browser" - 始终使用 crawl4ai 浏览器渲染
+DEFAULT_FETCH_MODE = "http"
+# 章节页 HTML 解析后端（selectolax / lxml / html.parser），None 时自动选择最快的可用后端
+HTML_PARSER_BACKEND = None
+# 单章最多抓取的页数，以及页数未知时每轮并发预取的页数
+MAX_CHAPTER_PAGES = 20
+PAGE_FANOUT_WINDOW = 4
+# Wattpad v3 故事接口：一次请求即可拿到目录及每章的修改时间
+STORY_API_FIELDS = "id,modifyDate,numParts,parts(id,title,url,modifyDate)"
+HTTP_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+
+class HostRateLimiter:
+    """按主机限速：同一主机的请求之间至少间隔 min_interval 秒"""
+
+    def __init__(self, min_interval=HOST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class StorySession:
+    """
+    单个故事共享的抓取会话
+    整个故事只启动一个浏览器实例，页面请求受并发上限和按主机限速约束。
+    fetch_mode 为 "http" 时优先使用共享连接池的纯 HTTP 请求，浏览器只在需要回退时才启动。
+    """
+
+    def __init__(self, cookies_str, max_concurrency=MAX_CONCURRENT_FETCHES, min_interval=HOST_MIN_INTERVAL,
+                 fetch_mode=DEFAULT_FETCH_MODE, rate_limiter=None):
+        if fetch_mode not in ("http", "browser"):
+            raise ValueError(f"未知的抓取方式: {fetch_mode}")
+        self.headers = {"Cookie": cookies_str}
+        self.fetch_mode = fetch_mode
+        self.max_concurrency = max_concurrency
+        self._http = None
+        self._crawler = None
+        self._crawler_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 多个故事同时下载时可传入共享的限速器，保证对同一主机的总请求频率不变
+        self._rate_limiter = rate_limiter or HostRateLimiter(min_interval)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get_crawler(self):
+        async with self._crawler_lock:
+            if self._crawler is None:
+                crawler = crawl4ai.AsyncWebCrawler()
+                await crawler.__aenter__()
+                self._crawler = crawler
+            return self._crawler
+
+    def _get_http(self):
+        if self._http is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._http = aiohttp.ClientSession(
+                connector=connector,
+                headers={**self.headers, "User-Agent": HTTP_USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+            )
+        return self._http
+
+    async def fetch_static_html(self, url, timeout=60000):
+        """纯 HTTP 获取静态 HTML（自动解压 gzip），失败返回 None"""
+        async with self._semaphore:
+            await self._rate_limiter.wait(url)
+            try:
+                async with self._get_http().get(url, timeout=aiohttp.ClientTimeout(total=timeout / 1000)) as resp:
+                    if resp.status != 200:
+                        print(f"HTTP 请求失败 {url}: {resp.status}")
+                        return None
+                    return await resp.text(errors='replace')
+            except Exception as e:
+                print(f"HTTP 请求异常 {url}: {e}")
+                return None
+
+    async def fetch_conditional(self, url, validators=None, timeout=60000):
+        """
+        带 If-None-Match / If-Modified-Since 的纯 HTTP 请求，失败返回 None
+        成功返回 (状态码, 正文, 新的校验信息 {"etag", "last_modified"})，304 时正文为 None。
+        """
+        validators = validators or {}
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        async with self._semaphore:
+            await self._rate_limiter.wait(url)
+            try:
+                async with self._get_http().get(url, headers=headers,
+                                                timeout=aiohttp.ClientTimeout(total=timeout / 1000)) as resp:
+                    body = None if resp.status == 304 else await resp.text(errors='replace')
+                    return resp.status, body, {"etag": resp.headers.get("ETag"),
+                                               "last_modified": resp.headers.get("Last-Modified")}
+            except Exception as e:
+                print(f"HTTP 请求异常 {url}: {e}")
+                return None
+
+    async def fetch_html(self, url, timeout=60000, has_content=None):
+        """
+        抓取页面 HTML，失败返回 None
+        http 模式下先取静态 HTML，has_content(html) 判定缺少内容时再用浏览器渲染。
+        """
+        if self.fetch_mode == "http":
+            html = await self.fetch_static_html(url, timeout)
+            if html is not None and (has_content is None or has_content(html)):
+                return html
+            print(f"静态页面缺少内容，回退到浏览器渲染: {url}")
+        return await self.fetch_rendered_html(url, timeout)
+
+    async def fetch_rendered_html(self, url, timeout=60000):
+        """通过浏览器渲染获取页面 HTML，失败返回 None"""
+        async with self._semaphore:
+            await self._rate_limiter.wait(url)
+            crawler = await self._get_crawler()
+            result = await crawler.arun(
+                url=url,
+                headers=self.headers,
+                timeout=timeout,
+                extraction_strategy=crawl4ai_extraction.NoExtractionStrategy()
+            )
+        if not result.success:
+            print(f"页面获取失败 {url}: {result.error_message}")
+            return None
+        return result.html
 
+    async def close(self):
+        if self._http is not None:
+            http, self._http = self._http, None
+            await http.close()
+        if self._crawler is not None:
+            crawler, self._crawler = self._crawler, None
+            await crawler.__aexit__(None, None, None)
 
-def load_status(output_dir):
-    """加载下载状态"""
-    status_path = os.path.join(output_dir, STATUS_FILE)
-    if os.path.exists(status_path):
-        try:
-            with open(status_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    return {
-        "completed_chapters": [],
-        "failed_chapters": [],
-        "total_chapters": 0,
-        "completed": False,
-        "audiobook_generated": False,
-        "rss_updated": False,
-        "last_updated": None
-    }
 
+# --- 爬取逻辑 ---
+def has_story_parts(html):
+    """主页静态 HTML 是否包含章节目录"""
+    return 'story-parts' in html
 
-def save_status(output_dir, status):
-    """保存下载状态"""
-    status["last_updated"] = datetime.now().isoformat()
-    status_path = os.path.join(output_dir, STATUS_FILE)
-    with open(status_path, 'w', encoding='utf-8') as f:
-        json.dump(status, f, ensure_ascii=False, indent=2)
 
+def has_story_text(html):
+    """章节页静态 HTML 是否包含正文容器"""
+    return '<pre' in html or 'data-testid="content"' in html or 'panel-reading' in html
 
-# --- 爬取逻辑 ---
-async def get_chapter_links(story_url: str, cookies_str: str):
-    """获取章节链接"""
+
+async def get_chapter_entries(session: StorySession, story_url: str):
+    """从故事主页获取章节目录 [{"url", "title"}, ...]"""
     print(f"正在获取故事主页: {story_url}")
-    headers = {"Cookie": cookies_str}
     try:
-        async with AsyncWebCrawler() as crawler:
-            result = await crawler.arun(
-                url=story_url,
-                headers=headers,
-                timeout=120000,
-                extraction_strategy=NoExtractionStrategy()
-            )
-            if result.success:
-                soup = BeautifulSoup(result.html, 'html.parser')
-                toc_container = soup.find('ul', {'aria-label': 'story-parts'})
-                chapter_links = []
-                if toc_container:
-                    for a in toc_container.find_all('a', href=True):
-                        href = a['href'].strip()
-                        if href.startswith('/'):
-                            href = "https://www.wattpad.com" + href
-                        base_url = href.split('#')[0]
-                        if base_url not in chapter_links:
-                            chapter_links.append(base_url)
-                print(f"提取到 {len(chapter_links)} 个章节链接。")
-                return chapter_links
-            else:
-                print(f"主页获取失败: {result.error_message}")
-                return []
+        html = await session.fetch_html(story_url, timeout=120000, has_content=has_story_parts)
+        if html is None:
+            return []
+        soup = BeautifulSoup(html, 'html.parser')
+        toc_container = soup.find('ul', {'aria-label': 'story-parts'})
+        chapter_links = []
+        entries = []
+        if toc_container:
+            for a in toc_container.find_all('a', href=True):
+                href = a['href'].strip()
+                # 相对链接按故事主页所在站点解析（也便于指向本地替身服务器测试）
+                href = urljoin(story_url, href)
+                base_url = href.split('#')[0]
+                if base_url not in chapter_links:
+                    chapter_links.append(base_url)
+                    entries.append({"url": base_url, "title": a.get_text(strip=True)})
+        print(f"提取到 {len(chapter_links)} 个章节链接。")
+        return entries
     except Exception as e:
         print(f"获取章节链接失败: {e}")
         return []
 
 
-async def download_single_page(page_url: str, headers: dict, page_index: int) -> str:
+def story_api_url(story_url):
+    """由故事主页地址得到 v3 故事接口地址，无法识别故事 ID 时返回 None"""
+    match = re.search(r'/story/(\d+)', story_url)
+    if not match:
+        return None
+    parsed = urlparse(story_url)
+    return f"{parsed.scheme}://{parsed.netloc}/api/v3/stories/{match.group(1)}?fields={STORY_API_FIELDS}"
+
+
+async def fetch_story_toc_from_api(session: StorySession, story_url: str, cached_toc=None):
+    """
+    通过 v3 故事接口获取目录，失败返回 None
+    带上次保存的 ETag / Last-Modified 发起条件请求，304 时直接返回缓存的目录。
+    """
+    api_url = story_api_url(story_url)
+    if api_url is None:
+        return None
+    validators = cached_toc if cached_toc and cached_toc.get("source") == "api" else None
+    response = await session.fetch_conditional(api_url, validators)
+    if response is None:
+        return None
+    status_code, body, new_validators = response
+    if status_code == 304 and validators:
+        return cached_toc
+    if status_code != 200:
+        return None
+    try:
+        data = json.loads(body)
+        chapters = [{"url": urljoin(story_url, part["url"]).split('#')[0], "title": part.get("title", ""),
+                     "modified": part.get("modifyDate")} for part in data["parts"]]
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"解析故事接口返回失败: {e}")
+        return None
+    if not chapters:
+        return None
+    return {"source": "api", "modified": data.get("modifyDate"), "chapters": chapters, **new_validators}
+
+
+async def get_story_toc(session: StorySession, story_url: str, cached_toc=None):
+    """
+    获取故事目录，返回 (目录, 是否与缓存一致)，失败时目录为 None
+    目录: {"source", "modified", "etag", "last_modified", "chapters": [{"url", "title", "modified"}]}
+    优先使用一次轻量的接口请求，接口不可用时回退到解析故事主页。
+    """
+    toc = await fetch_story_toc_from_api(session, story_url, cached_toc)
+    if toc is None:
+        entries = await get_chapter_entries(session, story_url)
+        if not entries:
+            return None, False
+        toc = {"source": "page", "modified": None, "etag": None, "last_modified": None,
+               "chapters": [{**entry, "modified": None} for entry in entries]}
+    elif toc is cached_toc:
+        print("故事目录未变化 (304)")
+        return toc, True
+    unchanged = bool(cached_toc) and cached_toc.get("chapters") == toc["chapters"]
+    return toc, unchanged
+
+
+def find_changed_chapters(old_toc, new_toc):
+    """
+    返回需要重新下载的已有章节序号（从 1 开始）
+    同一序号的章节地址变化，或两边都有修改时间且不一致时视为已变化；新增章节不在其中。
+    """
+    if not old_toc:
+        return set()
+    changed = set()
+    for index, (old, new) in enumerate(zip(old_toc.get("chapters", []), new_toc["chapters"]), 1):
+        if old["url"] != new["url"]:
+            changed.add(index)
+        elif old.get("modified") and new.get("modified") and old["modified"] != new["modified"]:
+            changed.add(index)
+    return changed
+
+
+async def download_single_page(session: StorySession, page_url: str, page_index: int) -> str:
     """下载单页内容"""
     try:
-        async with AsyncWebCrawler() as crawler:
-            result = await crawler.arun(
-                url=page_url,
-                headers=headers,
-                timeout=60000,
-                extraction_strategy=NoExtractionStrategy()
-            )
-            if not result.success:
-                return ""
-            soup = BeautifulSoup(result.html, 'html.parser')
-            pre = soup.find('pre')
-            content = ""
-            if pre:
-                ps = pre.find_all('p', attrs={'data-p-id': True})
-                content = '\n'.join(p.get_text(strip=True) for p in ps if p.get_text(strip=True))
-            else:
-                container = (soup.find('pre', id='storytext') or
-                             soup.find('div', {'data-testid': 'content'}) or
-                             soup.find('div', class_='panel-reading'))
-                if container:
-                    content = container.get_text(separator='\n', strip=True)
-            return content.strip()
-    except:
+        html = await session.fetch_html(page_url, has_content=has_story_text)
+        if html is None:
+            return ""
+        return extract_page_text(html, HTML_PARSER_BACKEND)
+    except Exception:
         return ""
 
 
-async def download_chapter_content(chapter_url: str, chapter_index: int, output_dir: str, cookies_str: str,
-                                   status: dict):
-    """下载单个章节（支持断点续传）"""
-    filename = f"Chapter_{chapter_index:04d}.txt"
-    filepath = os.path.join(output_dir, filename)
+def chapter_part_id(chapter_url):
+    """由章节地址（https://www.wattpad.com/<章节 ID>-<标题>）得到章节 ID，无法识别时返回 None"""
+    match = re.match(r'/(\d+)(?:-|$)', urlparse(chapter_url).path)
+    return match.group(1) if match else None
 
-    # 检查是否已成功下载
-    if chapter_index in status["completed_chapters"]:
-        print(f"({chapter_index}) 章节已标记为完成，跳过: {filepath}")
-        return True
 
-    # 检查文件是否存在且有效
-    if os.path.exists(filepath):
+def detect_page_count(html, part_id):
+    """
+    从章节首页内嵌的元数据中读取当前章节的总页数，找不到时返回 None
+    页面里还嵌有故事信息（其中的章节列表带有各章的 "pages"），因此优先取 "part.<章节 ID>.metadata" 下的值，
+    没有该键时才退回到 "id" 等于当前章节 ID 的 JSON 对象。
+    """
+    if not part_id:
+        return None
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r'"part\.%s\.metadata"\s*:\s*' % part_id, html):
+        try:
+            data, _ = decoder.raw_decode(html, match.end())
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            pages = (data.get("data") or data).get("pages")
+            if isinstance(pages, int) and pages > 0:
+                return pages
+    for match in re.finditer(r'\{\s*"id"\s*:\s*"?%s"?\s*[,}]' % part_id, html):
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-            if content and not content.startswith(("[警告]", "[错误]", "[异常]")) and len(content) > 20:
-                print(f"({chapter_index}) 文件已存在且有效，跳过: {filepath}")
-                if chapter_index not in status["completed_chapters"]:
-                    status["completed_chapters"].append(chapter_index)
-                    status["completed_chapters"] = sorted(list(set(status["completed_chapters"])))
-                    save_status(output_dir, status)
-                return True
-        except:
-            pass
+            data, _ = decoder.raw_decode(html, match.start())
+        except ValueError:
+            continue
+        pages = data.get("pages")
+        if isinstance(pages, int) and pages > 0:
+            return pages
+    return None
+
+
+async def download_remaining_pages(session: StorySession, chapter_url: str, page_count=None):
+    """
+    并发下载章节第 2 页及之后的内容，按页码顺序返回，遇到第一个空页即停止
+    已知总页数时一次性并发请求全部页面，并多请求一页（第 page_count + 1 页）校验页数；
+    该页仍有内容（元数据中的页数偏小）或页数未知时，每轮预取 PAGE_FANOUT_WINDOW 页，
+    发现空页后取消本轮中超出末尾的请求。
+    """
+    if page_count is None:
+        last_page, window_size = MAX_CHAPTER_PAGES, PAGE_FANOUT_WINDOW
+    else:
+        last_page = min(page_count + 1, MAX_CHAPTER_PAGES)
+        window_size = max(last_page - 1, 1)
+    contents = []
+    next_page = 2
+    while next_page <= last_page:
+        window = range(next_page, min(next_page + window_size, last_page + 1))
+        tasks = [asyncio.create_task(download_single_page(session, f"{chapter_url}/page/{page}", page))
+                 for page in window]
+        try:
+            for task in tasks:
+                content = await task
+                if not content:
+                    return contents
+                contents.append(content)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if page_count is not None and window.stop > page_count + 1:
+            print(f"页数信息为 {page_count}，但第 {page_count + 1} 页仍有内容，继续逐轮抓取: {chapter_url}")
+            page_count = None
+            last_page, window_size = MAX_CHAPTER_PAGES, PAGE_FANOUT_WINDOW
+        next_page = window.stop
+    return contents
+
+
+def chapter_file_path(output_dir, chapter_index):
+    return os.path.join(output_dir, f"Chapter_{chapter_index:04d}.txt")
+
+
+async def download_chapter_content(session: StorySession, chapter_url: str, chapter_index: int, output_dir: str,
+                                   status: StatusStore, force: bool = False):
+    """
+    下载单个章节（支持断点续传，force=True 时忽略已有文件重新下载）
+    在 pending_updates 中的章节（站点上已更新但尚未成功重新下载）总是强制重新下载，成功后才移出。
+    """
+    filepath = chapter_file_path(output_dir, chapter_index)
+    pending_updates = status.get("pending_updates", [])
+    force = force or chapter_index in pending_updates
+
+    if not force:
+        # 检查是否已成功下载
+        if status.is_completed(chapter_index):
+            print(f"({chapter_index}) 章节已标记为完成，跳过: {filepath}")
+            return True
+
+        # 检查文件是否存在且有效
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if content and not content.startswith(("[警告]", "[错误]", "[异常]")) and len(content) > 20:
+                    print(f"({chapter_index}) 文件已存在且有效，跳过: {filepath}")
+                    status.mark_completed(chapter_index)
+                    return True
+            except:
+                pass
 
     print(f"({chapter_index}) 正在下载章节...")
-    headers = {"Cookie": cookies_str}
     chapter_title = "未知章节"
     all_content = []
 
     # 获取第一页
-    async with AsyncWebCrawler() as crawler:
-        result = await crawler.arun(url=chapter_url, headers=headers, timeout=60000,
-                                    extraction_strategy=NoExtractionStrategy())
-        if not result.success:
-            print(f"({chapter_index}) 第一页加载失败")
-            return False
-        soup = BeautifulSoup(result.html, 'html.parser')
-        title_tag = soup.find('h1', class_='h2')
-        chapter_title = title_tag.get_text(strip=True) if title_tag else f"第 {chapter_index} 章"
-        pre = soup.find('pre')
-        if pre:
-            ps = pre.find_all('p', attrs={'data-p-id': True})
-            text = '\n'.join(p.get_text(strip=True) for p in ps if p.get_text(strip=True))
-            if text:
-                all_content.append(text)
-
-    # 后续页面
-    for page in range(2, 21):
-        page_url = f"{chapter_url}/page/{page}"
-        content = await download_single_page(page_url, headers, page)
-        if content:
-            all_content.append(content)
-        else:
-            break
-        await asyncio.sleep(0.5)
+    html = await session.fetch_html(chapter_url, has_content=has_story_text)
+    if html is None:
+        print(f"({chapter_index}) 第一页加载失败")
+        return False
+    title, text = extract_chapter_page(html, HTML_PARSER_BACKEND)
+    chapter_title = title or f"第 {chapter_index} 章"
+    if text:
+        all_content.append(text)
+
+    # 后续页面：根据首页的页数信息并发抓取（请求间隔由会话的按主机限速控制）
+    page_count = detect_page_count(html, chapter_part_id(chapter_url))
+    all_content.extend(await download_remaining_pages(session, chapter_url, page_count))
 
     final_content = "\n\n".join(all_content).strip()
     if not final_content:
@@ -208,22 +467,20 @@ async def download_chapter_content(chapter_url: str, chapter_index: int, output_
         f.write(output_text)
     print(f"({chapter_index}) 已保存: {filepath}")
 
-    # 更新状态
-    if chapter_index not in status["completed_chapters"]:
-        status["completed_chapters"].append(chapter_index)
-    status["completed_chapters"] = sorted(list(set(status["completed_chapters"])))
-    save_status(output_dir, status)
-
-    await asyncio.sleep(1)
+    # 更新状态（批量写入，由 StatusStore 决定何时落盘）
+    status.mark_completed(chapter_index)
+    if chapter_index in pending_updates:
+        status["pending_updates"] = [i for i in status.get("pending_updates", []) if i != chapter_index]
     return True
 
 
-async def retry_failed_chapters(output_dir, chapter_urls, cookies_str, status):
-    """重试失败章节"""
+async def retry_failed_chapters(session: StorySession, output_dir, chapter_urls, status):
+    """重试失败章节，返回本次重试后新完成的章节序号（调用方需为它们通知后续流程）"""
     error_files = glob.glob(os.path.join(output_dir, "*_ERROR.txt")) + glob.glob(
         os.path.join(output_dir, "*_EXCEPTION.txt"))
+    succeeded = []
     if not error_files:
-        return
+        return succeeded
 
     print(f"发现 {len(error_files)} 个失败章节，开始重试...")
     for file in error_files:
@@ -233,15 +490,25 @@ async def retry_failed_chapters(output_dir, chapter_urls, cookies_str, status):
             if 1 <= idx <= len(chapter_urls):
                 url = chapter_urls[idx - 1]
                 print(f"重试章节 {idx}")
-                await download_chapter_content(url, idx, output_dir, cookies_str, status)
+                was_completed = status.is_completed(idx)
+                if await download_chapter_content(session, url, idx, output_dir, status) and not was_completed:
+                    succeeded.append(idx)
                 try:
                     os.remove(file)
                 except:
                     pass
+    return succeeded
 
 
 # --- 主下载函数 ---
-async def download_single_story(story_info: dict, cookies_str: str, base_output_dir: str):
+async def download_story(story_info: dict, cookies_str: str, base_output_dir: str, rate_limiter=None,
+                         on_chapter=None):
+    """
+    下载阶段：获取目录，下载新增或有更新的章节
+    每个可用的章节文件（之前已完成的和本次新下载的）都会调用一次 on_chapter(章节文件路径)，
+    调用方可以在其余章节仍在下载时就开始合成。
+    返回 (故事目录, 状态, 是否需要后续处理)，获取目录失败时返回 None。
+    """
     story_url = story_info["url"].strip()
     story_title = story_info["title"].strip()
     story_output_dir = os.path.join(base_output_dir, story_title)
@@ -250,45 +517,92 @@ async def download_single_story(story_info: dict, cookies_str: str, base_output_
     print(f"\n=== 开始下载故事: {story_title} ===")
     start_time = time.time()
 
-    # 检查是否已完成
-    status = load_status(story_output_dir)
-    chapter_urls = await get_chapter_links(story_url, cookies_str)
-    if not chapter_urls:
-        print("未找到章节链接。")
-        return False
-
-    status["total_chapters"] = len(chapter_urls)
+    def _notify(index):
+        path = chapter_file_path(story_output_dir, index)
+        if on_chapter is not None and os.path.exists(path):
+            on_chapter(path)
 
-    # 即使故事已完成，也要继续执行后续流程
-    if status.get("completed", False) and len(status["completed_chapters"]) >= len(chapter_urls):
-        print(f"故事 '{story_title}' 已完成，继续执行后续流程...")
-    else:
-        print(f"共 {len(chapter_urls)} 章节，开始下载...")
-        for i, url in enumerate(chapter_urls, 1):
-            if i in status["completed_chapters"]:
-                continue
-            await download_chapter_content(url, i, story_output_dir, cookies_str, status)
-
-        # 重试失败
-        await retry_failed_chapters(story_output_dir, chapter_urls, cookies_str, status)
-
-        # 检查是否全部完成
-        completed = len(status["completed_chapters"]) >= len(chapter_urls)
-        status["completed"] = completed
-        save_status(story_output_dir, status)
-        print(f"故事下载阶段完成。")
+    # 检查是否已完成
+    status = StatusStore(story_output_dir)
+    # 整个故事共享一个浏览器实例
+    fetch_mode = story_info.get("fetch_mode", DEFAULT_FETCH_MODE)
+    async with StorySession(cookies_str, fetch_mode=fetch_mode, rate_limiter=rate_limiter) as session:
+        cached_toc = status.get("toc")
+        toc, toc_unchanged = await get_story_toc(session, story_url, cached_toc)
+        if toc is None:
+            print("未找到章节链接。")
+            return None
+        chapter_urls = [chapter["url"] for chapter in toc["chapters"]]
+
+        # 目录没有变化且后续流程都已完成：本次轮询无事可做
+        if (toc_unchanged and status.get("completed", False) and status.get("audiobook_generated", False)
+                and status.get("rss_updated", False) and status.completed_count >= len(chapter_urls)
+                and not status.get("pending_updates")):
+            print(f"故事 '{story_title}' 没有新章节，跳过。")
+            return story_output_dir, status, False
+
+        # 已下载但在站点上被修改或替换的章节需要重新下载
+        changed = find_changed_chapters(cached_toc, toc)
+        if changed:
+            print(f"检测到 {len(changed)} 个章节有更新: {sorted(changed)}")
+            status.discard_completed(changed)
+            status["completed"] = False
+            # 新目录保存后下次轮询不会再检测到这些变化，因此未成功重新下载的章节记在 pending_updates 中，
+            # 直到强制重新下载成功才移除（否则旧的章节文件会被直接当作已完成）
+            status["pending_updates"] = sorted(set(status.get("pending_updates", [])) | changed)
+        status["toc"] = toc
+        status["total_chapters"] = len(chapter_urls)
+
+        # 之前已完成的章节可以立即进入合成
+        for index in status.completed_chapters:
+            _notify(index)
+
+        # 即使故事已完成，也要继续执行后续流程
+        if (status.get("completed", False) and status.completed_count >= len(chapter_urls)
+                and not status.get("pending_updates")):
+            print(f"故事 '{story_title}' 已完成，继续执行后续流程...")
+        else:
+            print(f"共 {len(chapter_urls)} 章节，开始下载...")
+            chapter_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHAPTERS)
+
+            async def _download(index, url):
+                async with chapter_semaphore:
+                    try:
+                        ok = await download_chapter_content(session, url, index, story_output_dir, status)
+                    except Exception as e:
+                        # 单个章节出错不影响同一故事的其他章节
+                        print(f"({index}) 章节下载出错: {e}")
+                        return
+                if ok:
+                    _notify(index)
+
+            await asyncio.gather(*(_download(i, url) for i, url in enumerate(chapter_urls, 1)
+                                   if not status.is_completed(i)))
+
+            # 重试失败，重试成功的章节同样交给后续流程合成
+            for index in await retry_failed_chapters(session, story_output_dir, chapter_urls, status):
+                _notify(index)
+
+            # 检查是否全部完成
+            status["completed"] = status.completed_count >= len(chapter_urls)
+            status.save()
+            print(f"故事下载阶段完成。")
 
     end_time = time.time()
-    print(f"\n故事 '{story_title}' 处理完成。耗时: {end_time - start_time:.2f} 秒")
+    print(f"\n故事 '{story_title}' 下载阶段耗时: {end_time - start_time:.2f} 秒")
+    return story_output_dir, status, True
 
-    # 继续执行有声书生成和RSS更新流程，无论之前是否已完成
+
+def process_downloaded_story(story_output_dir: str, status: StatusStore):
+    """后续流程：为故事目录生成有声书并更新 RSS，成功返回 True"""
+    status["audiobook_generated"] = False
+    status["rss_updated"] = False
     try:
         # 延迟导入，避免在模块加载时就导入大型依赖
         print("开始执行有声书生成...")
         from batch_audiobook_generator import generate_audiobooks_in_directory
-        config_path = "config.yaml"
-        # force_rebuild=False 表示启用断点续传
-        generate_audiobooks_in_directory(story_output_dir, config_path, force_rebuild=False)
+        # force_rebuild=False 表示启用断点续传；RSS 在整个目录生成后统一更新一次
+        generate_audiobooks_in_directory(story_output_dir, CONFIG_PATH, force_rebuild=False, update_rss=False)
         status["audiobook_generated"] = True
         print("有声书生成调用完成。")
 
@@ -300,19 +614,126 @@ async def download_single_story(story_info: dict, cookies_str: str, base_output_
         print("RSS更新完成。")
 
         # 保存最终状态
-        save_status(story_output_dir, status)
+        status.save()
 
     except Exception as e:
         print(f"执行后续流程时出错: {e}")
         import traceback
         traceback.print_exc()
         # 保存当前状态
-        save_status(story_output_dir, status)
+        status.save()
         return False
 
     return True
 
 
+async def download_single_story(story_info: dict, cookies_str: str, base_output_dir: str):
+    """依次执行单个故事的下载、有声书生成和 RSS 更新"""
+    result = await download_story(story_info, cookies_str, base_output_dir)
+    if result is None:
+        return False
+    story_output_dir, status, needs_processing = result
+    if not needs_processing:
+        return True
+    # 继续执行有声书生成和RSS更新流程，无论之前是否已完成
+    return process_downloaded_story(story_output_dir, status)
+
+
+# --- 多故事编排 ---
+class StoryOrchestrator:
+    """
+    多故事三阶段流水线
+    1. 下载：最多 MAX_CONCURRENT_STORIES 个故事同时下载（共享按主机限速），属于网络密集型；
+    2. 合成：所有故事下载完成的章节进入同一个队列，由单个工作线程依次生成有声书，
+       模型在整个运行期间只加载一次，GPU 不必等待网络；
+    3. 发布：某个故事的章节全部合成后，单独排队更新它的 RSS。
+    慢的故事不会阻塞其他故事的下载和合成。
+    """
+
+    def __init__(self, cookies_str, base_output_dir=OUTPUT_DIR, max_concurrent_stories=MAX_CONCURRENT_STORIES,
+                 config_path=CONFIG_PATH):
+        self.cookies_str = cookies_str
+        self.base_output_dir = base_output_dir
+        self.config_path = config_path
+        self.rate_limiter = HostRateLimiter()
+        self._story_semaphore = asyncio.Semaphore(max_concurrent_stories)
+        self._synthesis_queue = asyncio.Queue()
+        self._rss_queue = asyncio.Queue()
+        self._results = {}
+
+    async def _download_stage(self, story_info):
+        title = story_info["title"].strip()
+        async with self._story_semaphore:
+            try:
+                result = await download_story(story_info, self.cookies_str, self.base_output_dir,
+                                              self.rate_limiter, on_chapter=self._synthesis_queue.put_nowait)
+            except Exception as e:
+                print(f"下载失败 {title}: {e}")
+                import traceback
+                traceback.print_exc()
+                result = None
+        if result is None:
+            self._results[title] = False
+            return
+        story_output_dir, status, needs_processing = result
+        if not needs_processing:
+            self._results[title] = True
+            return
+        # 故事结束标记排在它所有章节之后，合成阶段处理到这里即表示该故事已全部合成
+        self._synthesis_queue.put_nowait((title, story_output_dir, status))
+
+    async def _synthesis_stage(self):
+        from batch_audiobook_generator import process_txt_file
+        failures = {}
+        while True:
+            item = await self._synthesis_queue.get()
+            if item is None:
+                break
+            if isinstance(item, str):
+                story_dir = os.path.dirname(item)
+                ok = await asyncio.to_thread(process_txt_file, story_dir, item, self.config_path,
+                                             update_rss=False, progress=os.path.basename(item))
+                if not ok:
+                    failures[story_dir] = failures.get(story_dir, 0) + 1
+                continue
+            title, story_output_dir, status = item
+            failed = failures.pop(story_output_dir, 0)
+            status["audiobook_generated"] = failed == 0
+            status.save()
+            print(f"故事 '{title}' 合成阶段完成" + (f"，{failed} 个章节失败" if failed else ""))
+            self._rss_queue.put_nowait(item)
+        self._rss_queue.put_nowait(None)
+
+    async def _rss_stage(self):
+        while True:
+            item = await self._rss_queue.get()
+            if item is None:
+                break
+            title, story_output_dir, status = item
+            try:
+                from generate_and_deploy_rss import run_rss_update_process
+                await asyncio.to_thread(run_rss_update_process, story_output_dir)
+                status["rss_updated"] = True
+                print(f"故事 '{title}' RSS更新完成。")
+            except Exception as e:
+                status["rss_updated"] = False
+                print(f"故事 '{title}' RSS更新失败: {e}")
+            status.save()
+            self._results[title] = bool(status.get("audiobook_generated")) and status["rss_updated"]
+
+    async def run(self, stories):
+        """处理全部故事，返回 {故事标题: 是否成功}"""
+        from model_registry import model_session
+        # 整个运行期间保持模型会话，各章节合成复用同一批已加载的模型
+        with model_session():
+            synthesis = asyncio.create_task(self._synthesis_stage())
+            rss = asyncio.create_task(self._rss_stage())
+            await asyncio.gather(*(self._download_stage(story) for story in stories))
+            self._synthesis_queue.put_nowait(None)
+            await asyncio.gather(synthesis, rss)
+        return self._results
+
+
 # --- 主函数 ---
 async def main():
     if not YOUR_WATTPAD_COOKIES or "REPLACE" in YOUR_WATTPAD_COOKIES:
@@ -320,17 +741,8 @@ async def main():
         return
 
     print("=== 批量下载启动 ===")
-    success = 0
-    for i, story in enumerate(STORIES_TO_DOWNLOAD, 1):
-        print(f"\n--- 处理第 {i}/{len(STORIES_TO_DOWNLOAD)}: {story['title']} ---")
-        try:
-            if await download_single_story(story, YOUR_WATTPAD_COOKIES, OUTPUT_DIR):
-                success += 1
-        except Exception as e:
-            print(f"下载失败: {e}")
-            import traceback
-            traceback.print_exc()
-
+    results = await StoryOrchestrator(YOUR_WATTPAD_COOKIES).run(STORIES_TO_DOWNLOAD)
+    success = sum(1 for ok in results.values() if ok)
     print(f"\n=== 完成: {success}/{len(STORIES_TO_DOWNLOAD)} 成功 ===")
 
 
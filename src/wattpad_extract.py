@@ -0,0 +1,124 @@
+# wattpad_extract.py (Wattpad 章节页正文提取，可切换解析后端)
+import functools
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from lazy_imports import lazy_import
+
+selectolax_lexbor = lazy_import('selectolax.lexbor', "未安装 selectolax，请运行: pip install selectolax")
+lxml_html = lazy_import('lxml.html', "未安装 lxml，请运行: pip install lxml")
+
+# 按速度从快到慢排列，自动选择时取第一个可用的后端
+BACKEND_ORDER = ['selectolax', 'lxml', 'html.parser']
+_BACKEND_MODULES = {'selectolax': 'selectolax', 'lxml': 'lxml', 'html.parser': None}
+
+# html.parser 后端只构建标题和正文容器的子树，其余标签在解析时直接丢弃
+_STORY_STRAINER = SoupStrainer(['h1', 'pre'])
+
+_H2_CLASS_XPATH = "contains(concat(' ', normalize-space(@class), ' '), ' h2 ')"
+_PANEL_CLASS_XPATH = "contains(concat(' ', normalize-space(@class), ' '), ' panel-reading ')"
+
+
+@functools.lru_cache(maxsize=None)
+def _available_backends():
+    # 可用后端在进程内不会变化，只检测一次，避免每解析一页都重复 find_spec
+    return tuple(name for name in BACKEND_ORDER
+                 if _BACKEND_MODULES[name] is None or importlib.util.find_spec(_BACKEND_MODULES[name]) is not None)
+
+
+def available_backends():
+    """返回当前环境可用的解析后端（按速度排序）"""
+    return list(_available_backends())
+
+
+def resolve_backend(backend=None):
+    """backend 为 None 时自动选择最快的可用后端；指定的后端不可用时抛出 ValueError"""
+    available = _available_backends()
+    if backend is None:
+        return available[0]
+    if backend not in available:
+        raise ValueError(f"解析后端不可用: {backend}（可用: {', '.join(available)}）")
+    return backend
+
+
+def _join_paragraphs(texts):
+    return '\n'.join(text for text in texts if text)
+
+
+def _extract_soup(html):
+    # 先只解析 h1 / pre；页面没有 <pre> 时才完整解析以查找备用容器
+    soup = BeautifulSoup(html, 'html.parser', parse_only=_STORY_STRAINER)
+    title_tag = soup.find('h1', class_='h2')
+    title = title_tag.get_text(strip=True) if title_tag else None
+    pre = soup.find('pre')
+    if pre:
+        ps = pre.find_all('p', attrs={'data-p-id': True})
+        return title, _join_paragraphs(p.get_text(strip=True) for p in ps).strip()
+
+    soup = BeautifulSoup(html, 'html.parser')
+    container = soup.find('div', {'data-testid': 'content'}) or soup.find('div', class_='panel-reading')
+    text = container.get_text(separator='\n', strip=True) if container else ""
+    return title, text.strip()
+
+
+def _lxml_text(element, separator=''):
+    # 与 BeautifulSoup.get_text(strip=True) 一致：逐个文本节点去空白后拼接，忽略注释
+    return separator.join(text.strip() for text in element.xpath('.//text()') if text.strip())
+
+
+def _extract_lxml(html):
+    root = lxml_html.document_fromstring(html)
+    titles = root.xpath(f'//h1[{_H2_CLASS_XPATH}]')
+    title = _lxml_text(titles[0]) if titles else None
+    pres = root.xpath('//pre')
+    if pres:
+        ps = pres[0].xpath('.//p[@data-p-id]')
+        return title, _join_paragraphs(_lxml_text(p) for p in ps).strip()
+
+    containers = (root.xpath('//div[@data-testid="content"]') or
+                  root.xpath(f'//div[{_PANEL_CLASS_XPATH}]'))
+    text = _lxml_text(containers[0], '\n') if containers else ""
+    return title, text.strip()
+
+
+def _selectolax_text(node, separator=''):
+    texts = (child.text(deep=False).strip() for child in node.traverse(include_text=True)
+             if child.tag == '-text')
+    return separator.join(text for text in texts if text)
+
+
+def _extract_selectolax(html):
+    tree = selectolax_lexbor.LexborHTMLParser(html)
+    title_node = tree.css_first('h1.h2')
+    title = _selectolax_text(title_node) if title_node is not None else None
+    pre = tree.css_first('pre')
+    if pre is not None:
+        ps = pre.css('p[data-p-id]')
+        return title, _join_paragraphs(_selectolax_text(p) for p in ps).strip()
+
+    container = tree.css_first('div[data-testid="content"]')
+    if container is None:
+        container = tree.css_first('div.panel-reading')
+    text = _selectolax_text(container, '\n') if container is not None else ""
+    return title, text.strip()
+
+
+_EXTRACTORS = {
+    'selectolax': _extract_selectolax,
+    'lxml': _extract_lxml,
+    'html.parser': _extract_soup,
+}
+
+
+def extract_chapter_page(html, backend=None):
+    """
+    从章节页 HTML 中提取 (标题, 正文)，找不到标题时标题为 None
+    正文优先取 <pre> 下带 data-p-id 的段落，没有 <pre> 时取备用正文容器的全部文本。
+    """
+    return _EXTRACTORS[resolve_backend(backend)](html)
+
+
+def extract_page_text(html, backend=None):
+    """从章节页 HTML 中提取正文"""
+    return extract_chapter_page(html, backend)[1]